@@ -1,42 +1,179 @@
 import os
-from utils.file_utils import load_and_split_document
-from utils.logging_config import logger
+import uuid
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from utils.file_utils import get_file_loader, iter_document_batches
+from utils.blob_store import create_blob_store, pack_chunks
+from utils.document_registry import chunk_hash
+from utils.logging_config import setup_logging, logger
+from config import config
 
 class IngestionAgent:
-    def __init__(self, bus):
+    REQUIRED_MODELS = ()  # Parsing and chunking only; embeddings are computed by the RetrievalAgent
+
+    def __init__(self, bus, processes: int = config.INGESTION_PROCESSES):
         self.name = "IngestionAgent"
         self.bus = bus
+        self.blob_store = create_blob_store()
+        self.processes = processes
+        self._pool = None
 
     def handle_message(self, message):
-        if message["type"] != "INGEST":
-            return
+        # UPDATE_DOCUMENT is parsed like INGEST; the RetrievalAgent then replaces the old version.
+        if message["type"] in ("INGEST", "UPDATE_DOCUMENT"):
+            if self.processes > 0:
+                pool = self._get_pool()
+                future = pool.submit(_ingest_in_pool, message)
+                future.add_done_callback(lambda f: self._check_pool_result(message, f, pool))
+            else:
+                self.ingest_file(message)
+        elif message["type"] == "INGEST_DIRECTORY":
+            self.ingest_directory(message["payload"]["directory"], reply_to=message.get("reply_to", "Coordinator"))
 
+    def ingest_file(self, message) -> dict:
+        """Parses, chunks and ships one file. Failures are reported, never raised."""
         file_path = message["payload"]["file_path"]
         file_name = message["payload"]["file_name"]
+        summary = {"file_name": file_name, "chunks": 0, "batches": 0, "error": None}
 
         try:
             logger.info(f"[{self.name}] Processing file: {file_name}")
-            chunks = load_and_split_document(file_path)
-            if not chunks:
+            # Pages are parsed, split and shipped batch by batch, so the RetrievalAgent can
+            # start embedding while the rest of the document is still being read.
+            total_chunks, batch_index = 0, -1
+            pending = None
+            chunk_hashes = []
+            for batch in iter_document_batches(file_path):
+                if pending is not None:
+                    self._send_batch(message, file_name, pending, batch_index, last_batch=False)
+                batch_index += 1
+                total_chunks += len(batch)
+                chunk_hashes.extend(chunk_hash(chunk.page_content) for chunk in batch)
+                pending = batch
+            if pending is None:
                 logger.warning(f"[{self.name}] Could not extract any chunks from {file_name}. It might be empty or an unsupported format.")
-                return
-
-            logger.info(f"[{self.name}] Processed {file_name} into {len(chunks)} chunks.")
-
-            self.bus.send({
-                "sender": self.name,
-                "receiver": "RetrievalAgent",
-                "type": "ADD_DOCUMENT",
-                "trace_id": message["trace_id"],
-                "payload": {
-                    "document_id": file_name,
-                    "chunks": [chunk.page_content for chunk in chunks],
-                    "metadatas": [chunk.metadata for chunk in chunks]
-                }
-            })
+                return summary
+            self._send_batch(message, file_name, pending, batch_index, last_batch=True, chunk_hashes=chunk_hashes)
+
+            summary.update(chunks=total_chunks, batches=batch_index + 1)
+            logger.info(f"[{self.name}] Processed {file_name} into {total_chunks} chunks ({batch_index + 1} batches).")
         except Exception as e:
             logger.error(f"[{self.name}] Error processing {file_name}: {e}", exc_info=True)
+            summary["error"] = str(e)
+            self._report_failure(message, str(e))
         finally:
             # Clean up the temporary file
-            if os.path.exists(file_path):
-                os.unlink(file_path)
\ No newline at end of file
+            if message["payload"].get("delete_after", True) and os.path.exists(file_path):
+                os.unlink(file_path)
+        return summary
+
+    def ingest_directory(self, directory: str, reply_to: str = "Coordinator") -> list[dict]:
+        """Ingests every supported file under `directory`, returning one summary per file in order."""
+        messages = []
+        for root, _, files in os.walk(directory):
+            for file in sorted(files):
+                file_path = os.path.join(root, file)
+                if get_file_loader(file_path) is None:
+                    continue
+                messages.append({
+                    "sender": self.name,
+                    "receiver": self.name,
+                    # Re-importing a directory replaces changed files instead of duplicating them.
+                    "type": "UPDATE_DOCUMENT",
+                    "trace_id": str(uuid.uuid4()),
+                    "reply_to": reply_to,
+                    "payload": {
+                        "file_path": file_path,
+                        "file_name": os.path.relpath(file_path, directory),
+                        "delete_after": False,
+                    }
+                })
+        logger.info(f"[{self.name}] Bulk importing {len(messages)} file(s) from {directory}.")
+
+        if self.processes <= 0:
+            return [self.ingest_file(message) for message in messages]
+        pool = self._get_pool()
+        futures = [pool.submit(_ingest_in_pool, message) for message in messages]
+        return [self._check_pool_result(message, future, pool) for message, future in zip(messages, futures)]
+
+    def _get_pool(self):
+        if self._pool is None:
+            # Spawned workers open their own Redis connections instead of inheriting ours.
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_pool_worker,
+            )
+        return self._pool
+
+    def _check_pool_result(self, message, future, pool) -> dict:
+        """Returns a pool task's summary, reporting files whose worker process died."""
+        try:
+            return future.result()
+        except Exception as e:
+            file_name = message["payload"]["file_name"]
+            logger.error(f"[{self.name}] Worker process failed on {file_name}: {e}")
+            if isinstance(e, BrokenProcessPool):
+                # Release the broken executor's management thread and queued work. Several failed
+                # tasks report the same pool, which may already have been replaced by a new one.
+                pool.shutdown(wait=False, cancel_futures=True)
+                if self._pool is pool:
+                    self._pool = None  # Recreated on the next submission.
+            self._report_failure(message, str(e))
+            return {"file_name": file_name, "chunks": 0, "batches": 0, "error": str(e)}
+
+    def _send_batch(self, message, file_name, chunks, batch_index, last_batch, chunk_hashes=None):
+        update = message["type"] == "UPDATE_DOCUMENT"
+        # One round trip for both. Progress is pushed first so it can never overwrite the
+        # RetrievalAgent's "indexed" update.
+        self.bus.send_many([{
+            "sender": self.name,
+            "receiver": message.get("reply_to", "Coordinator"),
+            "type": "INGEST_PROGRESS",
+            "trace_id": message["trace_id"],
+            "payload": {"document_id": file_name, "stage": "parsed", "batch_index": batch_index,
+                        "chunks": len(chunks), "last_batch": last_batch}
+        }, {
+            "sender": self.name,
+            "receiver": "RetrievalAgent",
+            "type": "UPDATE_DOCUMENT" if update else "ADD_DOCUMENT",
+            "trace_id": message["trace_id"],
+            "reply_to": message.get("reply_to", "Coordinator"),
+            "payload": {
+                "document_id": file_name,
+                "batch_index": batch_index,
+                "last_batch": last_batch,
+                # Lets the RetrievalAgent tell when every batch is indexed, whatever order they finish in.
+                **({"batch_count": batch_index + 1} if last_batch else {}),
+                # The complete new version, so the RetrievalAgent can drop chunks that are gone.
+                **({"chunk_hashes": chunk_hashes} if update and last_batch else {}),
+                **pack_chunks(
+                    self.blob_store,
+                    [chunk.page_content for chunk in chunks],
+                    [chunk.metadata for chunk in chunks],
+                ),
+            }
+        }])
+
+    def _report_failure(self, message, error):
+        self.bus.send({
+            "sender": self.name,
+            "receiver": message.get("reply_to", "Coordinator"),
+            "type": "INGEST_PROGRESS",
+            "trace_id": message["trace_id"],
+            "payload": {"document_id": message["payload"]["file_name"], "stage": "failed", "error": error}
+        })
+
+# --- Process pool workers ---
+
+_pool_agent = None
+
+def _init_pool_worker():
+    global _pool_agent
+    from message_bus import RedisBus
+    setup_logging()
+    _pool_agent = IngestionAgent(RedisBus(), processes=0)
+
+def _ingest_in_pool(message) -> dict:
+    return _pool_agent.ingest_file(message)
@@ -1,14 +1,26 @@
 # agents/llm_response_agent.py
 
+import time
+import threading
 from utils.inference import LocalInference, InferenceError
+from utils.generation_scheduler import GenerationScheduler, SchedulerBusy, DeadlineExpired
+from utils.context_packing import pack_context
+from utils.tracing import tracer
 from utils.logging_config import logger
+from config import config
 
 class LLMResponseAgent:
-    def __init__(self, bus, inference_service: LocalInference):
+    REQUIRED_MODELS = ("llm",)
+
+    def __init__(self, bus, inference_service: LocalInference, scheduler: GenerationScheduler | None = None):
         self.name = "LLMResponseAgent"
         self.bus = bus
         self.inference = inference_service
-        self.prompt_template = self._create_prompt_template()
+        # Generations run on the scheduler's slots; handle_message only queues them.
+        self.scheduler = scheduler or GenerationScheduler()
+        # Worker consumers take a message only with a free permit, so replicas never hoard the shared queue.
+        self.capacity = threading.Semaphore(self.scheduler.slots + config.LLM_CONSUMER_LOOKAHEAD)
+        self.prompt_prefix, self.prompt_suffix_template = self._create_prompt_template()
 
     def _create_prompt_template(self):
         # A robust prompt template designed for Mistral Instruct models
@@ -16,26 +28,83 @@ class LLMResponseAgent:
 - If the user asks for a summary, synthesize the key points from the context into a coherent summary.
 - If the context does not contain the answer, you must state that the information is not available in the documents. Do not use outside knowledge."""
         
-        # This is the Mistral instruction format
-        template = f"<s>[INST] {system_prompt} [/INST]</s>\n[INST] Based on the context below:\n\n---\nContext:\n{{context}}\n---\n\nAnswer this question: {{query}} [/INST]"
-        return template
+        # This is the Mistral instruction format. The system part never changes, so it is
+        # kept separate and its evaluated state can be reused across requests.
+        prefix = f"<s>[INST] {system_prompt} [/INST]</s>\n"
+        suffix = "[INST] Based on the context below:\n\n---\nContext:\n{context}\n---\n\nAnswer this question: {query} [/INST]"
+        return prefix, suffix
+
+    def _build_context(self, chunks, query):
+        """Packs the retrieved chunks into whatever room the prompt leaves in the context window."""
+        overhead = (self.inference.count_tokens(self.prompt_prefix)
+                    + self.inference.count_tokens(self.prompt_suffix_template.format(context="", query=query)))
+        budget = config.LLM_CONTEXT_LENGTH - config.LLM_MAX_NEW_TOKENS - overhead
+        return pack_context(chunks, self.inference.count_tokens, max(budget, 0))
 
     def handle_message(self, message):
+        """Answers a RETRIEVAL_RESULT; returns the Future of the queued generation, if one was needed."""
         if message["type"] != "RETRIEVAL_RESULT":
             return
-        
-        context = "\n\n---\n\n".join(message["payload"]["top_chunks"])
+        payload = message["payload"]
+        if not payload["top_chunks"]:
+            # Nothing to generate, so there is no reason to wait for a slot.
+            with tracer.span(f"{self.name}.{message['type']}", trace_id=message.get("trace_id")):
+                self._respond(message, slot=None)
+            return
+
+        priority = payload.get("priority", "interactive")
+        if priority not in config.LLM_PRIORITIES:
+            priority = "interactive"
+        submitted_at = time.time()
+        future = self.scheduler.submit(
+            lambda slot: self._run(message, slot, submitted_at), priority=priority, deadline=payload.get("deadline")
+        )
+        future.add_done_callback(lambda f: self._check_scheduled(message, f))
+        return future
+
+    def _run(self, message, slot, submitted_at):
+        # Runs on a scheduler thread, so the trace context is re-established here.
+        tracer.record_span("llm.queue_wait", submitted_at, time.time() - submitted_at, trace_id=message.get("trace_id"))
+        with tracer.span(f"{self.name}.{message['type']}", trace_id=message.get("trace_id"), slot=slot):
+            self._respond(message, slot)
+
+    def _check_scheduled(self, message, future):
+        error = future.exception()
+        if isinstance(error, SchedulerBusy):
+            logger.warning(f"[{self.name}] Shedding request {message['trace_id']}: {error}")
+            self.bus.send({
+                "sender": self.name,
+                "receiver": message.get("reply_to", "Coordinator"),
+                "type": "LLM_RESPONSE",
+                "trace_id": message["trace_id"],
+                "payload": {"answer": "The assistant is busy right now. Please try again in a moment.",
+                            "sources": [], "busy": True}
+            })
+        elif isinstance(error, DeadlineExpired):
+            # The client has already given up on this request; answering would only add load.
+            logger.warning(f"[{self.name}] Dropped request {message['trace_id']}: {error}")
+
+    def _respond(self, message, slot):
         query = message["payload"]["query"]
-        
-        prompt = self.prompt_template.format(context=context, query=query)
+        stream = message["payload"].get("stream", False)
         
         response_text = ""
+        generated = False
+        outgoing = []  # Final LLM_TOKEN flush, sent together with the response
         try:
             if not message["payload"]["top_chunks"]:
                 response_text = "I couldn't find any relevant information in the uploaded documents to answer your question."
             else:
                 logger.info(f"[{self.name}] Generating response for query: '{query}'")
-                response_text = self.inference.generate_text(prompt)
+                with tracer.span("llm.pack_context", chunks=len(message["payload"]["top_chunks"])):
+                    context = self._build_context(message["payload"]["top_chunks"], query)
+                prompt = self.prompt_prefix + self.prompt_suffix_template.format(context=context, query=query)
+                prefix = self.prompt_prefix if config.LLM_PREFIX_REUSE else None
+                if stream:
+                    response_text, outgoing = self._stream_response(prompt, prefix, message, slot)
+                else:
+                    response_text = self.inference.generate_text(prompt, prefix=prefix, slot=slot)
+                generated = True
         except InferenceError as e:
             logger.error(f"[{self.name}] Inference failed: {e}")
             response_text = str(e)
@@ -43,10 +112,46 @@ class LLMResponseAgent:
             logger.error(f"[{self.name}] An unexpected error occurred: {e}", exc_info=True)
             response_text = "I encountered a critical error while generating a response."
         
-        self.bus.send({
+        self.bus.send_many(outgoing + [{
             "sender": self.name,
-            "receiver": "Coordinator", 
+            "receiver": message.get("reply_to", "Coordinator"),
             "type": "LLM_RESPONSE",
             "trace_id": message["trace_id"],
             "payload": {"answer": response_text.strip(), "sources": message["payload"]["sources"]}
-        })
\ No newline at end of file
+        }])
+
+        # Hand successful answers to the semantic cache of every RetrievalAgent replica.
+        cache_key = message["payload"].get("cache_key")
+        if generated and cache_key:
+            self.bus.publish(config.ANSWER_CACHE_CHANNEL, {
+                "sender": self.name,
+                "type": "CACHE_ANSWER",
+                "trace_id": message["trace_id"],
+                "payload": {**cache_key, "answer": response_text.strip(), "sources": message["payload"]["sources"]}
+            })
+
+        # The answer is already on its way; re-evaluate the system prompt before the next request arrives.
+        if generated and config.LLM_PREFIX_REUSE:
+            self.inference.prime_prefix(self.prompt_prefix, slot=slot)
+
+    def _stream_response(self, prompt, prefix, message, slot):
+        """Publishes LLM_TOKEN messages as text is generated; returns the full response and the still unsent final flush."""
+        pieces, pending = [], []
+        for piece in self.inference.stream_text(prompt, prefix=prefix, slot=slot):
+            pieces.append(piece)
+            pending.append(piece)
+            # The first piece goes out alone so time-to-first-token isn't held back by batching.
+            if len(pieces) == 1 or len(pending) >= config.LLM_STREAM_CHUNK_TOKENS:
+                self.bus.send(self._token_message(message, "".join(pending), len(pieces)))
+                pending = []
+        tail = [self._token_message(message, "".join(pending), len(pieces))] if pending else []
+        return "".join(pieces), tail
+
+    def _token_message(self, message, text, sequence) -> dict:
+        return {
+            "sender": self.name,
+            "receiver": message.get("reply_to", "Coordinator"),
+            "type": "LLM_TOKEN",
+            "trace_id": message["trace_id"],
+            "payload": {"text": text, "sequence": sequence}
+        }
\ No newline at end of file
@@ -1,58 +1,237 @@
+import time
+import uuid
+import threading
+import numpy as np
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from utils.inference import LocalInference
+from utils.index_store import IndexStore
+from utils.ann_index import IndexEngine
+from utils.answer_cache import SemanticAnswerCache
+from utils.blob_store import create_blob_store, iter_chunk_batches
+from utils.lexical_index import reciprocal_rank_fusion
+from utils.document_registry import chunk_hash
+from utils.ingest_tracker import IngestTracker
+from utils.tracing import tracer
 from utils.logging_config import logger
 from config import config
 
 class RetrievalAgent:
+    REQUIRED_MODELS = ("embedding", "reranker")
+
     def __init__(self, bus, inference_service: LocalInference):
         self.name = "RetrievalAgent"
         self.bus = bus
         self.inference = inference_service
-        self.vector_store = None
+        self.embedding_interface = self.inference.embeddings
 
-        self.embedding_interface = HuggingFaceEmbeddings(
-            model_name=config.EMBEDDING_MODEL_NAME,
-            cache_folder=config.MODEL_CACHE_DIR,
-            model_kwargs={'device': config.DEVICE}
-        )
+        # Restore the index persisted by previous sessions instead of re-ingesting everything.
+        self.index_store = IndexStore()
+        self.index_engine = IndexEngine()
+        self.vector_store = self.index_store.load(self.embedding_interface)
+        self.index_engine.prepare(self.vector_store)
+        self.answer_cache = SemanticAnswerCache()
+        # Every replica keeps its own cache, so answers are broadcast rather than queued to one of them.
+        self.bus.subscribe(config.ANSWER_CACHE_CHANNEL, self._handle_cache_answer)
+        self.blob_store = create_blob_store()
+        # Batches of one document may be indexed by different threads or replicas, in any order.
+        self.ingest_tracker = IngestTracker(self.bus.redis_client)
+        # Worker threads share this agent; FAISS must not be searched while it is being mutated.
+        self._lock = threading.RLock()
+        threading.Thread(target=self._compact_periodically, name=f"{self.name}-compaction", daemon=True).start()
 
     def handle_message(self, message):
-        try:
-            if message["type"] == "ADD_DOCUMENT":
-                self._handle_add_document(message)
-            elif message["type"] == "RETRIEVE":
-                self._handle_retrieve(message)
-        except Exception as e:
-            logger.error(f"[{self.name}] Failed to handle message: {e}", exc_info=True)
+        with tracer.span(f"{self.name}.{message['type']}", trace_id=message.get("trace_id")) as span:
+            try:
+                if message["type"] in ("ADD_DOCUMENT", "UPDATE_DOCUMENT"):
+                    self._handle_add_document(message)
+                elif message["type"] == "DELETE_DOCUMENT":
+                    self._handle_delete_document(message)
+                elif message["type"] == "RETRIEVE":
+                    self._handle_retrieve(message)
+                elif message["type"] == "CACHE_ANSWER":
+                    self._handle_cache_answer(message)
+            except Exception as e:
+                span["error"] = str(e)
+                logger.error(f"[{self.name}] Failed to handle message: {e}", exc_info=True)
 
     def _handle_add_document(self, message):
-        chunks = message["payload"]["chunks"]
-        metadatas = message["payload"]["metadatas"]
         doc_id = message['payload']['document_id']
 
         logger.info(f"[{self.name}] Creating or updating FAISS index for document: {doc_id}")
-        if self.vector_store is None:
-            self.vector_store = FAISS.from_texts(
-                texts=chunks, embedding=self.embedding_interface, metadatas=metadatas
-            )
-        else:
-            self.vector_store.add_texts(texts=chunks, metadatas=metadatas)
-        logger.info(f"[{self.name}] Successfully added {doc_id} to vector store.")
+        # Large documents arrive as blob references and are indexed one bounded batch at a time.
+        indexed, reused = 0, 0
+        for chunks, metadatas in iter_chunk_batches(self.blob_store, message["payload"]):
+            added = self._add_chunks(doc_id, chunks, metadatas)
+            indexed += added
+            reused += len(chunks) - added
+
+        payload = message["payload"]
+        batch_index = payload.get("batch_index", 0)
+        batch_count = payload.get("batch_count", batch_index + 1) if payload.get("last_batch", True) else None
+        totals = self.ingest_tracker.record(message["trace_id"], doc_id, indexed, reused,
+                                            batch_count=batch_count, keep_hashes=payload.get("chunk_hashes"))
+        removed = 0
+        if totals and message["type"] == "UPDATE_DOCUMENT":
+            # Every batch of the new version is indexed now; whatever isn't in it is stale.
+            removed = self._remove_chunks(doc_id, keep_hashes=totals["keep_hashes"])
+        self.bus.send({
+            "sender": self.name,
+            "receiver": message.get("reply_to", "Coordinator"),
+            "type": "INGEST_PROGRESS",
+            "trace_id": message["trace_id"],
+            "payload": {"document_id": doc_id, "stage": "indexed", "batch_index": batch_index,
+                        "chunks": totals["chunks"] if totals else indexed,
+                        "reused": totals["reused"] if totals else reused,
+                        "removed": removed, "last_batch": totals is not None}
+        })
+        if not totals:
+            logger.info(f"[{self.name}] Indexed batch {batch_index} of {doc_id} ({indexed} chunks).")
+            return
+
+        logger.info(f"[{self.name}] Successfully added {doc_id} to vector store (version {self.index_store.version}).")
+        cache_stats = self.inference.embedding_cache.stats()
+        logger.info(f"[{self.name}] Embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+                    f"({cache_stats['hit_rate']:.0%} hit rate, {cache_stats['entries']} entries).")
+
+    def _add_chunks(self, document_id, chunks, metadatas) -> int:
+        """Indexes the chunks the document doesn't already have and returns how many that was."""
+        with self._lock:
+            self._refresh_vector_store()
+            known = self.index_store.registry.chunk_hashes(document_id)
+        # Unchanged chunks of a re-uploaded document are neither re-embedded nor duplicated.
+        fresh = {}
+        for chunk, metadata in zip(chunks, metadatas):
+            digest = chunk_hash(chunk)
+            if digest not in known and digest not in fresh:
+                fresh[digest] = (chunk, {**metadata, "document_id": document_id, "chunk_hash": digest})
+        if not fresh:
+            return 0
+
+        with tracer.span("retrieval.embed_chunks", chunks=len(fresh)):
+            vectors = self.embedding_interface.embed_documents([chunk for chunk, _ in fresh.values()])
+        with tracer.span("retrieval.index_write", chunks=len(fresh)), self._lock, self.index_store.write_lock():
+            # Another replica may have published since we last looked; append on top of it.
+            self._refresh_vector_store()
+            known = self.index_store.registry.chunk_hashes(document_id)
+            rows = [(fresh[digest], vector) for digest, vector in zip(fresh, vectors) if digest not in known]
+            if not rows:
+                return 0
+            chunks = [chunk for (chunk, _), _ in rows]
+            metadatas = [metadata for (_, metadata), _ in rows]
+            vectors = [vector for _, vector in rows]
+            ids = [str(uuid.uuid4()) for _ in chunks]
+            if self.vector_store is None:
+                self.vector_store = FAISS.from_embeddings(
+                    list(zip(chunks, vectors)), self.embedding_interface, metadatas=metadatas, ids=ids
+                )
+            else:
+                self.index_store.ensure_writable(self.vector_store)
+                self.vector_store.add_embeddings(list(zip(chunks, vectors)), metadatas=metadatas, ids=ids)
+            entries = [(i, self.vector_store.docstore.search(i)) for i in ids]
+            self.index_store.lexical_index.add(ids, chunks)
+            self.index_store.registry.add(entries)
+
+            if self.index_engine.maybe_migrate(self.vector_store):
+                # The index type changed, so segments can't be replayed onto the old base.
+                self.index_store.snapshot(self.vector_store)
+            else:
+                # Persist only what was just added; the store folds segments into snapshots itself.
+                self.index_store.append(self.vector_store, vectors, entries)
+        return len(ids)
+
+    def _remove_chunks(self, document_id, keep_hashes=()) -> int:
+        """Deletes the document's chunks except those in `keep_hashes`; returns how many were removed."""
+        with tracer.span("retrieval.remove_chunks"), self._lock, self.index_store.write_lock():
+            self._refresh_vector_store()
+            if self.vector_store is None:
+                return 0
+            doc_ids = self.index_store.registry.chunk_ids(document_id, exclude_hashes=keep_hashes)
+            self.index_store.delete(self.vector_store, doc_ids)
+        if doc_ids:
+            logger.info(f"[{self.name}] Removed {len(doc_ids)} chunk(s) of {document_id}.")
+        return len(doc_ids)
+
+    def _handle_delete_document(self, message):
+        doc_id = message["payload"]["document_id"]
+        removed = self._remove_chunks(doc_id)
+        self.bus.send({
+            "sender": self.name,
+            "receiver": message.get("reply_to", "Coordinator"),
+            "type": "INGEST_PROGRESS",
+            "trace_id": message["trace_id"],
+            "payload": {"document_id": doc_id, "stage": "deleted", "removed": removed, "last_batch": True}
+        })
+
+    def compact(self, force: bool = False) -> bool:
+        """Drops deleted chunks from the index once they make up COMPACTION_MIN_DELETED_RATIO of it."""
+        with self._lock, self.index_store.write_lock():
+            self._refresh_vector_store()
+            if self.vector_store is None:
+                return False
+            deleted = len(self.index_store.registry.tombstones)
+            total = self.vector_store.index.ntotal
+            if not deleted or (not force and deleted < total * config.COMPACTION_MIN_DELETED_RATIO):
+                return False
+            with tracer.span("retrieval.compact", deleted=deleted, total=total):
+                self.index_store.compact(self.vector_store)
+            self.index_engine.prepare(self.vector_store)
+        return True
+
+    def _compact_periodically(self):
+        while True:
+            time.sleep(config.COMPACTION_INTERVAL_SECONDS)
+            try:
+                self.compact()
+            except Exception as e:
+                logger.error(f"[{self.name}] Background compaction failed: {e}", exc_info=True)
 
     def _handle_retrieve(self, message):
         query = message["payload"]["query"]
-        top_chunks, sources = [], []
+        top_chunks, sources, cache_key = [], [], None
+
+        with self._lock:
+            self._refresh_vector_store()
+            index_version = self.index_store.version
 
         if self.vector_store:
+            with tracer.span("retrieval.embed_query"):
+                query_vector = self.embedding_interface.embed_query(query)
+            with tracer.span("retrieval.answer_cache") as span:
+                cached = self.answer_cache.lookup(query_vector, index_version)
+                span["hit"] = cached is not None
+            if cached:
+                logger.info(f"[{self.name}] Answer cache hit for query: '{query}'")
+                self._send_cached_answer(message, cached)
+                return
+            cache_key = {"query_vector": query_vector, "index_version": index_version}
+
             logger.info(f"[{self.name}] Retrieving documents for query: '{query}'")
-            # 1. Initial retrieval
-            results = self.vector_store.similarity_search(query, k=config.INITIAL_RETRIEVAL_K)
+            # 1. Initial retrieval: dense candidates, fused with lexical (BM25) ones in hybrid mode
+            with self._lock:
+                with tracer.span("retrieval.dense_search", k=config.INITIAL_RETRIEVAL_K):
+                    dense_hits = self._dense_search(query_vector, config.INITIAL_RETRIEVAL_K)
+                dense_ids = [doc_id for doc_id, _ in dense_hits]
+                if config.HYBRID_RETRIEVAL:
+                    with tracer.span("retrieval.lexical_search", k=config.LEXICAL_RETRIEVAL_K):
+                        lexical_ids = [doc_id for doc_id, _ in self.index_store.lexical_index.search(query, config.LEXICAL_RETRIEVAL_K)]
+                    candidate_ids = reciprocal_rank_fusion([dense_ids, lexical_ids])[:config.INITIAL_RETRIEVAL_K]
+                else:
+                    candidate_ids = dense_ids
+                results = [self.vector_store.docstore.search(doc_id) for doc_id in candidate_ids]
             initial_docs = {doc.page_content: doc.metadata for doc in results}
 
-            # 2. Reranking for relevance
+            # 2. Reranking for relevance. Dense scores let the reranker skip clear-cut cases,
+            # but only when every candidate has one (lexical-only hits do not).
+            dense_similarity = {doc_id: 1 - distance / 2 for doc_id, distance in dense_hits}
+            dense_scores = None
+            if all(doc_id in dense_similarity for doc_id in candidate_ids) and len(initial_docs) == len(candidate_ids):
+                dense_scores = [dense_similarity[doc_id] for doc_id in candidate_ids]
             logger.info(f"[{self.name}] Reranking {len(initial_docs)} documents.")
-            reranked_chunks = self.inference.rerank_documents(query, list(initial_docs.keys()))
+            with tracer.span("retrieval.rerank", candidates=len(initial_docs)):
+                reranked_chunks = self.inference.rerank_documents(
+                    query, list(initial_docs.keys()), top_n=config.FINAL_RETRIEVAL_K, dense_scores=dense_scores
+                )
+            logger.debug(f"[{self.name}] Rerank stats: {self.inference.rerank_stage.stats()}")
 
             # 3. Select top K and get their sources
             top_chunks = reranked_chunks[:config.FINAL_RETRIEVAL_K]
@@ -67,5 +246,60 @@ class RetrievalAgent:
             "receiver": "LLMResponseAgent",
             "type": "RETRIEVAL_RESULT",
             "trace_id": message["trace_id"],
-            "payload": {"query": query, "top_chunks": top_chunks, "sources": sources}
-        })
\ No newline at end of file
+            "reply_to": message.get("reply_to", "Coordinator"),
+            "payload": {
+                "query": query,
+                "top_chunks": top_chunks,
+                "sources": sources,
+                "stream": message["payload"].get("stream", False),
+                "cache_key": cache_key,
+                "deadline": message["payload"].get("deadline"),
+                "priority": message["payload"].get("priority", "interactive"),
+            }
+        })
+
+    def _dense_search(self, query_vector, k):
+        """Returns (docstore_id, L2 distance) pairs for the k nearest live chunks."""
+        tombstones = self.index_store.registry.tombstones
+        total = self.vector_store.index.ntotal
+        if total == 0:
+            return []
+        # Deleted chunks are still in the index until compaction, so over-fetch and filter them out.
+        fetch = min(k * 2, total) if tombstones else k
+        while True:
+            distances, positions = self.vector_store.index.search(np.array([query_vector], dtype=np.float32), fetch)
+            hits = [
+                (self.vector_store.index_to_docstore_id[position], float(distance))
+                for position, distance in zip(positions[0], distances[0]) if position != -1
+            ]
+            hits = [(doc_id, distance) for doc_id, distance in hits if doc_id not in tombstones]
+            if len(hits) >= k or fetch >= min(total, k + len(tombstones)):
+                return hits[:k]
+            fetch = min(total, k + len(tombstones))
+
+    def _refresh_vector_store(self):
+        vector_store = self.index_store.refresh(self.vector_store, self.embedding_interface)
+        if vector_store is not self.vector_store:
+            self.index_engine.prepare(vector_store)
+        self.vector_store = vector_store
+
+    def _send_cached_answer(self, message, cached):
+        """Answers straight from the semantic cache without involving the LLMResponseAgent."""
+        self.bus.send({
+            "sender": self.name,
+            "receiver": message.get("reply_to", "Coordinator"),
+            "type": "LLM_RESPONSE",
+            "trace_id": message["trace_id"],
+            "payload": {"answer": cached["answer"], "sources": cached["sources"], "cached": True}
+        })
+
+    def _handle_cache_answer(self, message):
+        payload = message["payload"]
+        with self._lock:
+            # A replica that hasn't seen the latest version yet would otherwise drop valid answers.
+            self._refresh_vector_store()
+            index_version = self.index_store.version
+        # Answers generated against an older index may be stale, so they are not cached.
+        if payload["index_version"] != index_version:
+            return
+        self.answer_cache.store(payload["query_vector"], payload["index_version"], payload["answer"], payload["sources"])
\ No newline at end of file
@@ -0,0 +1,124 @@
+# agents/worker.py
+
+"""Runs one agent as standalone worker processes that consume its queue with BLPOP."""
+
+import argparse
+import signal
+import threading
+import multiprocessing
+from message_bus import RedisBus
+from utils.tracing import tracer
+from utils.logging_config import setup_logging, logger
+from config import config
+
+AGENT_NAMES = ("IngestionAgent", "RetrievalAgent", "LLMResponseAgent")
+
+def build_agent(agent_name: str, bus: RedisBus):
+    """Creates the named agent with an inference service limited to the models it declares."""
+    if agent_name == "IngestionAgent":
+        from agents.ingestion_agent import IngestionAgent
+        return IngestionAgent(bus)
+
+    from utils.inference import LocalInference
+    if agent_name == "RetrievalAgent":
+        from agents.retrieval_agent import RetrievalAgent
+        return RetrievalAgent(bus, LocalInference(components=RetrievalAgent.REQUIRED_MODELS))
+    if agent_name == "LLMResponseAgent":
+        from agents.llm_response_agent import LLMResponseAgent
+        return LLMResponseAgent(bus, LocalInference(components=LLMResponseAgent.REQUIRED_MODELS))
+    raise ValueError(f"Unknown agent: {agent_name}")
+
+def _consume(agent, stop_event: threading.Event):
+    """Handles messages until shutdown; a message in progress is always finished."""
+    # Agents that finish messages in the background (LLMResponseAgent) expose a `capacity` semaphore.
+    # A message is only taken with a permit, held until its Future settles, so work they have no room
+    # for stays in Redis for whichever replica frees up first.
+    capacity = getattr(agent, "capacity", None)
+    while not stop_event.is_set():
+        if capacity is not None and not capacity.acquire(timeout=config.WORKER_POLL_TIMEOUT):
+            continue
+        pending = None
+        try:
+            message = agent.bus.receive(agent.name, block=True, timeout=config.WORKER_POLL_TIMEOUT)
+            if message:
+                pending = agent.handle_message(message)
+        finally:
+            if capacity is not None:
+                if pending is None:
+                    capacity.release()
+                else:
+                    pending.add_done_callback(lambda _: capacity.release())
+
+def run_worker(agent_name: str, concurrency: int, metrics_port: int = config.METRICS_PORT):
+    setup_logging()
+    if metrics_port:
+        tracer.start_metrics_server(metrics_port)
+    stop_event = threading.Event()
+
+    def request_stop(signum, _frame):
+        logger.info(f"[{agent_name}] Received signal {signum}, finishing in-flight messages...")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    agent = build_agent(agent_name, RedisBus())
+    inference = getattr(agent, "inference", None)
+    if inference is not None and config.WARM_UP_MODELS:
+        # Consumers start right away; a message that arrives first simply waits for its model.
+        inference.warm_up(agent.REQUIRED_MODELS)
+    threads = [
+        threading.Thread(target=_consume, args=(agent, stop_event), name=f"{agent_name}-{i}")
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    logger.info(f"[{agent_name}] Worker started with concurrency {concurrency}.")
+
+    # Join with a timeout so the main thread stays responsive to signals.
+    while any(thread.is_alive() for thread in threads):
+        for thread in threads:
+            thread.join(timeout=1)
+    scheduler = getattr(agent, "scheduler", None)
+    if scheduler is not None:
+        # Generations run on the scheduler's own threads: finish the running ones, answer the queued ones "busy".
+        logger.info(f"[{agent_name}] Waiting for running generations to finish...")
+        scheduler.shutdown(wait=True)
+    logger.info(f"[{agent_name}] Worker stopped.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an agent as a standalone worker.")
+    parser.add_argument("agent", choices=AGENT_NAMES)
+    parser.add_argument("--replicas", type=int, default=1, help="Number of worker processes.")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="Message-handling threads per process (defaults to WORKER_CONCURRENCY).")
+    args = parser.parse_args()
+    concurrency = args.concurrency or config.WORKER_CONCURRENCY.get(args.agent, 1)
+
+    if args.replicas <= 1:
+        run_worker(args.agent, concurrency)
+        return
+
+    setup_logging()
+    processes = [
+        # Each replica keeps its own metrics, so each gets its own port.
+        multiprocessing.Process(target=run_worker, args=(args.agent, concurrency, config.METRICS_PORT and config.METRICS_PORT + i),
+                                name=f"{args.agent}-replica-{i}")
+        for i in range(args.replicas)
+    ]
+    for process in processes:
+        process.start()
+
+    def forward_stop(signum, _frame):
+        logger.info(f"[{args.agent}] Received signal {signum}, stopping {len(processes)} replica(s)...")
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, forward_stop)
+    signal.signal(signal.SIGINT, forward_stop)
+    for process in processes:
+        process.join()
+
+if __name__ == "__main__":
+    main()
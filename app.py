@@ -1,14 +1,18 @@
 # app.py
 
 import os
-import uuid
+import hashlib
 import tempfile
+import itertools
+import threading
 import streamlit as st
 from message_bus import RedisBus
+from client import RAGClient
 from agents.ingestion_agent import IngestionAgent
 from agents.retrieval_agent import RetrievalAgent
 from agents.llm_response_agent import LLMResponseAgent
 from utils.inference import LocalInference
+from utils.tracing import tracer
 from utils.logging_config import setup_logging
 from config import config
 
@@ -16,17 +20,31 @@ from config import config
 def initialize_system():
     """Initialize and persist all stateful components across reruns."""
     setup_logging()
+    if config.METRICS_PORT:
+        tracer.start_metrics_server(config.METRICS_PORT)
     
     # Initialize expensive, stateless singletons only once
     if "bus" not in st.session_state:
         st.session_state.bus = RedisBus()
+    if "client" not in st.session_state:
+        # Each browser session gets its own reply queue, so answers never cross sessions.
+        st.session_state.client = RAGClient(st.session_state.bus)
+    if config.EXTERNAL_WORKERS:
+        # Agents run as separate worker processes; the UI only sends and awaits messages.
+        return st.session_state.bus, {}
+
     if "inference_service" not in st.session_state:
         st.session_state.inference_service = LocalInference()
+        if config.WARM_UP_MODELS:
+            # The UI renders immediately; models load behind it and otherwise on first use.
+            st.session_state.inference_service.warm_up()
     
     # Initialize stateful agents only once
     if "agents" not in st.session_state:
         st.session_state.agents = {
-            "IngestionAgent": IngestionAgent(st.session_state.bus),
+            # Parsed inline: process_agent_queues only drains what is queued, so batches a pool
+            # produced later would sit unconsumed until the next interaction.
+            "IngestionAgent": IngestionAgent(st.session_state.bus, processes=0),
             "RetrievalAgent": RetrievalAgent(st.session_state.bus, st.session_state.inference_service),
             "LLMResponseAgent": LLMResponseAgent(st.session_state.bus, st.session_state.inference_service),
         }
@@ -36,24 +54,29 @@ def initialize_system():
 # --- END OF THE FIX ---
 
 def process_agent_queues(agents):
-    """Process all messages for each agent in a loop."""
-    processed_message = True
-    while processed_message:
-        processed_message = False
-        for agent_name, agent in agents.items():
-            # The agent's name matches its queue name
-            if not agent.bus.is_empty(agent.name):
-                message = agent.bus.receive(agent.name, block=False)
-                if message:
-                    agent.handle_message(message)
-                    processed_message = True
+    """Process all messages for each agent until every queue is empty."""
+    if not agents:
+        return
+    by_queue = {agent.name: agent for agent in agents.values()}  # The agent's name matches its queue name
+    bus = next(iter(by_queue.values())).bus
+    while True:
+        # One round trip takes the head of every agent's queue.
+        received = bus.receive_any(list(by_queue))
+        if not received:
+            return
+        for agent_name, message in received:
+            by_queue[agent_name].handle_message(message)
 
 def main():
     st.set_page_config(page_title="Mutli  Agentic Rag", layout="wide")
     st.title("🧠 Multi Agent  QA Chatbot")
 
     if "processed_files" not in st.session_state:
-        st.session_state.processed_files = set()
+        # File name -> content hash of the version that was ingested.
+        st.session_state.processed_files = {}
+    if "deleted_files" not in st.session_state:
+        # Deleted files still listed in the uploader, so reruns don't ingest them again.
+        st.session_state.deleted_files = {}
     if "chat_history" not in st.session_state:
         st.session_state.chat_history = []
     
@@ -68,26 +91,70 @@ def main():
             accept_multiple_files=True
         )
         
-        if uploaded_files:
-            new_files = [f for f in uploaded_files if f.name not in st.session_state.processed_files]
-            if new_files:
-                with st.spinner("Processing documents..."):
-                    for file in new_files:
-                        with tempfile.NamedTemporaryFile(delete=False, suffix=f"_{file.name}") as tmp_file:
-                            tmp_file.write(file.getvalue())
-                            file_path = tmp_file.name
-                        
-                        bus.send({
-                            "sender": "Coordinator",
-                            "receiver": "IngestionAgent",
-                            "type": "INGEST",
-                            "trace_id": str(uuid.uuid4()),
-                            "payload": {"file_path": file_path, "file_name": file.name}
-                        })
-                        st.session_state.processed_files.add(file.name)
+        processed_files = st.session_state.processed_files
+        deleted_files = st.session_state.deleted_files
+        uploaded_hashes = {f.name: hashlib.sha256(f.getvalue()).hexdigest() for f in uploaded_files or []}
+        for name in list(deleted_files):
+            if name not in uploaded_hashes:
+                del deleted_files[name]
+
+        # A known name with new content is an update: only its changed chunks are re-indexed.
+        new_files = [
+            f for f in uploaded_files or []
+            if uploaded_hashes[f.name] not in (processed_files.get(f.name), deleted_files.get(f.name))
+        ]
+        if new_files:
+            with st.spinner("Processing documents..."):
+                for file in new_files:
+                    with tempfile.NamedTemporaryFile(delete=False, suffix=f"_{file.name}") as tmp_file:
+                        tmp_file.write(file.getvalue())
+                        file_path = tmp_file.name
                     
-                    process_agent_queues(agents)
+                    if file.name in processed_files:
+                        st.session_state.client.update(file_path, file.name)
+                    else:
+                        st.session_state.client.ingest(file_path, file.name)
+                    processed_files[file.name] = uploaded_hashes[file.name]
+                    deleted_files.pop(file.name, None)
+                
+                process_agent_queues(agents)
+            if agents:
                 st.sidebar.success(f"{len(new_files)} new document(s) processed!")
+            else:
+                st.sidebar.success(f"{len(new_files)} new document(s) queued for the ingestion workers.")
+
+        if processed_files:
+            with st.expander("📚 Documents"):
+                for name in sorted(processed_files):
+                    name_column, button_column = st.columns([4, 1])
+                    name_column.caption(name)
+                    if button_column.button("🗑️", key=f"delete-{name}", help=f"Remove {name} from the knowledge base"):
+                        st.session_state.client.delete(name)
+                        deleted_files[name] = processed_files.pop(name)
+                        process_agent_queues(agents)
+                        st.rerun()
+
+        progress = st.session_state.client.progress()
+        if progress:
+            with st.expander("Ingestion progress"):
+                for document_id, update in progress.items():
+                    if update["stage"] == "failed":
+                        st.caption(f"❌ {document_id}: {update['error']}")
+                    elif update["stage"] == "deleted":
+                        st.caption(f"🗑️ {document_id}: removed")
+                    elif update["stage"] == "indexed" and update["last_batch"]:
+                        st.caption(f"✅ {document_id}")
+                    else:
+                        st.caption(f"⏳ {document_id}: batch {update['batch_index'] + 1} {update['stage']}")
+    
+        inference_service = st.session_state.get("inference_service")
+        if inference_service is not None:
+            with st.expander("Model status", expanded=not inference_service.is_ready()):
+                icons = {"ready": "✅", "loading": "⏳", "failed": "❌", "not_loaded": "💤"}
+                for component, state in inference_service.readiness.items():
+                    seconds = inference_service.load_times.get(component)
+                    timing = f" ({seconds:.1f}s)" if seconds is not None else ""
+                    st.caption(f"{icons[state]} {component}: {state}{timing}")
     
     st.header("💬 Chat with your Documents")
     for msg in st.session_state.chat_history:
@@ -103,31 +170,37 @@ def main():
         with st.chat_message("user"):
             st.markdown(prompt)
 
-        with st.spinner("Thinking..."):
-            trace_id = str(uuid.uuid4())
-            bus.send({
-                "sender": "Coordinator",
-                "receiver": "RetrievalAgent",
-                "type": "RETRIEVE",
-                "trace_id": trace_id,
-                "payload": {"query": prompt}
-            })
-            process_agent_queues(agents)
-            
-            response_message = bus.receive("Coordinator", block=True, timeout=30)
-            
-            if response_message and response_message.get("trace_id") == trace_id:
-                response_payload = response_message["payload"]
-                st.session_state.chat_history.append({
-                    "role": "assistant",
-                    "content": response_payload["answer"],
-                    "sources": response_payload["sources"]
-                })
+        request = st.session_state.client.submit(prompt, stream=True)
+        # In-process agents run beside the UI thread so streamed tokens can be rendered as they arrive.
+        agent_thread = threading.Thread(target=process_agent_queues, args=(agents,), daemon=True)
+        agent_thread.start()
+
+        response_payload = None
+        with st.chat_message("assistant"):
+            placeholder = st.empty()
+            streamed_text = ""
+            tokens = request.tokens()
+            with st.spinner("Thinking..."):
+                first_piece = next(tokens, "")
+            for piece in itertools.chain([first_piece], tokens):
+                streamed_text += piece
+                placeholder.markdown(streamed_text + "▌")
+            if request.future.done() and not request.future.cancelled() and not request.future.exception():
+                response_payload = request.result()
             else:
-                st.session_state.chat_history.append({
-                    "role": "assistant",
-                    "content": "Sorry, I could not retrieve an answer in time. Please try again."
-                })
+                request.cancel()
+
+        if response_payload:
+            st.session_state.chat_history.append({
+                "role": "assistant",
+                "content": response_payload["answer"],
+                "sources": response_payload["sources"]
+            })
+        else:
+            st.session_state.chat_history.append({
+                "role": "assistant",
+                "content": "Sorry, I could not retrieve an answer in time. Please try again."
+            })
         st.rerun()
 
 if __name__ == "__main__":
@@ -0,0 +1 @@
+"""Offline benchmarks for ingestion, retrieval and answering; see benchmarks/run.py."""
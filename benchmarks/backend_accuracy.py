@@ -0,0 +1,112 @@
+# benchmarks/backend_accuracy.py
+
+"""Checks the int8 ONNX embedder and reranker against their PyTorch originals; exits 1 below the thresholds."""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import numpy as np
+
+def _paragraphs(directory: str) -> list[str]:
+    paragraphs = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith((".txt", ".md")):
+            with open(os.path.join(directory, name), encoding="utf-8", errors="ignore") as f:
+                paragraphs.extend(part.strip() for part in f.read().split("\n\n") if len(part.strip()) > 40)
+    return paragraphs
+
+def _top(scores, k: int) -> set[int]:
+    return set(np.argsort(-np.asarray(scores))[:k].tolist())
+
+def run(args) -> dict:
+    from sentence_transformers import SentenceTransformer, CrossEncoder
+    from utils.onnx_models import OnnxEmbedder, OnnxCrossEncoder
+    from benchmarks.corpus import SyntheticCorpus
+    from config import config
+
+    rng = random.Random(args.seed)
+    if args.documents:
+        passages = _paragraphs(args.documents)
+        queries = [" ".join(passage.split()[:8]) + "?" for passage in rng.sample(passages, min(args.queries, len(passages)))]
+    else:
+        corpus = SyntheticCorpus(seed=args.seed)
+        with tempfile.TemporaryDirectory() as directory:
+            corpus.write_documents(directory, args.synthetic_documents)
+            passages = _paragraphs(directory)
+        queries = corpus.queries(args.queries)
+    passages = rng.sample(passages, min(args.passages, len(passages)))
+    k, candidates = config.FINAL_RETRIEVAL_K, config.INITIAL_RETRIEVAL_K
+    batch_size = config.EMBEDDING_MAX_BATCH_SIZE
+
+    embedders = {
+        "torch": SentenceTransformer(config.EMBEDDING_MODEL_NAME, cache_folder=config.MODEL_CACHE_DIR, device="cpu"),
+        "onnx": OnnxEmbedder(config.EMBEDDING_MODEL_NAME),
+    }
+    vectors, timings = {}, {}
+    for backend, model in embedders.items():
+        start = time.perf_counter()
+        vectors[backend] = (np.asarray(model.encode(passages, batch_size=batch_size)),
+                            np.asarray(model.encode(queries, batch_size=batch_size)))
+        timings[f"{backend}_embed_seconds"] = time.perf_counter() - start
+
+    def cosine(a, b):
+        return (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+    cosines = np.concatenate([cosine(vectors["torch"][0], vectors["onnx"][0]), cosine(vectors["torch"][1], vectors["onnx"][1])])
+
+    # Negative L2 distances, so the ranking matches the FAISS store's search.
+    def similarities(backend, query_index):
+        passage_vectors, query_vectors = vectors[backend]
+        return -np.linalg.norm(passage_vectors - query_vectors[query_index], axis=1)
+    retrieval_overlap = [len(_top(similarities("torch", i), k) & _top(similarities("onnx", i), k)) / k
+                         for i in range(len(queries))]
+
+    rerankers = {
+        "torch": CrossEncoder(config.RERANKER_MODEL_NAME, cache_folder=config.MODEL_CACHE_DIR, device="cpu"),
+        "onnx": OnnxCrossEncoder(config.RERANKER_MODEL_NAME),
+    }
+    pair_lists = []
+    for i, query in enumerate(queries):
+        pair_lists.append([(query, passages[j]) for j in sorted(_top(similarities("torch", i), candidates))])
+    scores = {}
+    for backend, model in rerankers.items():
+        start = time.perf_counter()
+        scores[backend] = [np.asarray(model.predict(pairs, batch_size=len(pairs))) for pairs in pair_lists]
+        timings[f"{backend}_rerank_seconds"] = time.perf_counter() - start
+    rerank_overlap = [len(_top(a, k) & _top(b, k)) / min(k, len(a)) for a, b in zip(scores["torch"], scores["onnx"])]
+    score_difference = max(float(np.abs(a - b).max()) for a, b in zip(scores["torch"], scores["onnx"]))
+
+    return {
+        "passages": len(passages),
+        "queries": len(queries),
+        "embedding": {"mean_cosine": float(cosines.mean()), "min_cosine": float(cosines.min())},
+        "retrieval": {f"top{k}_overlap": float(np.mean(retrieval_overlap))},
+        "rerank": {f"top{k}_overlap": float(np.mean(rerank_overlap)), "max_score_difference": score_difference},
+        "speed": timings,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the ONNX int8 backend with PyTorch.")
+    parser.add_argument("--documents", default=None, help="Directory of .txt/.md files (synthetic corpus if omitted).")
+    parser.add_argument("--synthetic-documents", type=int, default=40)
+    parser.add_argument("--passages", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="Lowest acceptable mean cosine similarity.")
+    parser.add_argument("--min-overlap", type=float, default=0.9, help="Lowest acceptable mean top-k overlap.")
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+
+    report = run(args)
+    print(json.dumps(report, indent=2))
+    overlaps = [value for section in ("retrieval", "rerank") for name, value in report[section].items() if name.endswith("_overlap")]
+    if report["embedding"]["mean_cosine"] < args.min_cosine or min(overlaps) < args.min_overlap:
+        print("ONNX backend is below the accuracy thresholds.")
+        return 1
+    print("ONNX backend matches PyTorch within the thresholds.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+# benchmarks/corpus.py
+
+"""Synthetic, reproducible document corpus in which every paragraph carries a unique REF identifier to query for."""
+
+import os
+import random
+
+# Paragraph counts of the short, medium and long documents, drawn in this ratio.
+DOCUMENT_SIZES = {"short": (2, 6), "medium": (10, 30), "long": (60, 150)}
+SIZE_WEIGHTS = (6, 3, 1)
+
+def _vocabulary(rng: random.Random, size: int = 5000) -> list[str]:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(size)]
+
+class SyntheticCorpus:
+    def __init__(self, seed: int = 13):
+        self.rng = random.Random(seed)
+        self.vocabulary = _vocabulary(self.rng)
+        self.facts: list[str] = []  # One sentence per paragraph written so far, to build queries from.
+        self._asked: set[str] = set()
+        self.documents_written = 0
+
+    def _sentence(self, length: int) -> str:
+        words = self.rng.choices(self.vocabulary, k=length)
+        return " ".join(words).capitalize() + "."
+
+    def _document(self, number: int) -> str:
+        kind = self.rng.choices(list(DOCUMENT_SIZES), weights=SIZE_WEIGHTS)[0]
+        paragraphs = []
+        for paragraph in range(self.rng.randint(*DOCUMENT_SIZES[kind])):
+            identifier = f"REF-{number:05d}-{paragraph}"
+            fact = f"{identifier} {self._sentence(self.rng.randint(8, 16))}"
+            self.facts.append(fact)
+            body = " ".join(self._sentence(self.rng.randint(8, 24)) for _ in range(self.rng.randint(3, 8)))
+            paragraphs.append(f"{fact} {body}")
+        return "\n\n".join(paragraphs)
+
+    def write_documents(self, directory: str, count: int) -> list[str]:
+        """Writes `count` more documents as .txt files and returns their paths."""
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for _ in range(count):
+            number = self.documents_written
+            path = os.path.join(directory, f"doc-{number:05d}.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(self._document(number))
+            self.documents_written += 1
+            paths.append(path)
+        return paths
+
+    def queries(self, count: int) -> list[str]:
+        """Questions about facts written so far. No fact is asked about twice, so the answer cache stays cold."""
+        unasked = [fact for fact in self.facts if fact not in self._asked]
+        chosen = self.rng.sample(unasked, min(count, len(unasked)))
+        self._asked.update(chosen)
+        questions = []
+        for fact in chosen:
+            identifier, sentence = fact.split(" ", 1)
+            words = sentence.rstrip(".").split()
+            questions.append(f"What does {identifier} say about {' '.join(words[:4]).lower()}?")
+        return questions
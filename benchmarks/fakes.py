@@ -0,0 +1,232 @@
+# benchmarks/fakes.py
+
+"""Deterministic stand-ins for Redis and the models, so benchmarks run the real agents offline."""
+
+import time
+import zlib
+import threading
+import numpy as np
+from collections import deque
+from message_bus import RedisBus
+from utils.inference import LocalInference
+from utils.lexical_index import tokenize
+
+EMBEDDING_DIM = 384  # Same as all-MiniLM-L6-v2, so PQ_M and index files match production.
+
+class InMemoryRedis:
+    """The subset of the redis-py client (decode_responses=False) that the agents use, backed by in-process structures."""
+    def __init__(self):
+        self._lists: dict[str, deque] = {}
+        self._condition = threading.Condition()
+        self._subscribers: dict[str, list] = {}
+        self._hashes: dict[str, dict] = {}
+
+    def ping(self):
+        return True
+
+    def rpush(self, key, *values):
+        with self._condition:
+            queue = self._lists.setdefault(key, deque())
+            queue.extend(values)
+            self._condition.notify_all()
+            return len(queue)
+
+    def lpop(self, key):
+        with self._condition:
+            queue = self._lists.get(key)
+            return queue.popleft() if queue else None
+
+    def blpop(self, keys, timeout=0):
+        keys = [keys] if isinstance(keys, str) else list(keys)
+        deadline = time.monotonic() + timeout if timeout else None
+        with self._condition:
+            while True:
+                for key in keys:
+                    queue = self._lists.get(key)
+                    if queue:
+                        return key.encode("utf-8"), queue.popleft()
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+
+    def lrange(self, key, start, end):
+        with self._condition:
+            items = list(self._lists.get(key, ()))
+            return items[start:] if end == -1 else items[start:end + 1]
+
+    def ltrim(self, key, start, end):
+        with self._condition:
+            if key in self._lists:
+                items = list(self._lists[key])
+                self._lists[key] = deque(items[start:] if end == -1 else items[start:end + 1])
+            return True
+
+    def hset(self, key, mapping):
+        with self._condition:
+            self._hashes.setdefault(key, {}).update({field: str(value).encode("utf-8") for field, value in mapping.items()})
+            return len(mapping)
+
+    def hincrby(self, key, field, amount=1):
+        with self._condition:
+            fields = self._hashes.setdefault(key, {})
+            value = int(fields.get(field, b"0")) + amount
+            fields[field] = str(value).encode("utf-8")
+            return value
+
+    def hgetall(self, key):
+        with self._condition:
+            return {field.encode("utf-8"): value for field, value in self._hashes.get(key, {}).items()}
+
+    def expire(self, key, seconds):
+        return key in self._hashes or key in self._lists  # Benchmarks are too short for expiry to matter.
+
+    def pipeline(self, transaction=True):
+        return _InMemoryPipeline(self)
+
+    def publish(self, channel, data):
+        # Delivered on the publisher's thread; real Redis would use the subscriber's.
+        handlers = list(self._subscribers.get(channel, ()))
+        for handler in handlers:
+            handler({"type": "message", "channel": channel.encode("utf-8"), "data": data})
+        return len(handlers)
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return _InMemoryPubSub(self)
+
+    def llen(self, key):
+        with self._condition:
+            return len(self._lists.get(key, ()))
+
+    def delete(self, *keys):
+        with self._condition:
+            return sum((self._lists.pop(key, None) is not None) + (self._hashes.pop(key, None) is not None) for key in keys)
+
+class _InMemoryPipeline:
+    """Queues commands and runs them together under the client's lock, like MULTI/EXEC."""
+    def __init__(self, client: InMemoryRedis):
+        self._client = client
+        self._commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self._commands.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        commands, self._commands = self._commands, []
+        with self._client._condition:
+            return [getattr(self._client, name)(*args, **kwargs) for name, args, kwargs in commands]
+
+class _InMemoryPubSub:
+    def __init__(self, client: InMemoryRedis):
+        self._client = client
+        self._handlers = {}
+
+    def subscribe(self, **handlers):
+        self._handlers.update(handlers)
+        for channel, handler in handlers.items():
+            self._client._subscribers.setdefault(channel, []).append(handler)
+
+    def run_in_thread(self, sleep_time=0, daemon=True):
+        return self  # Handlers already run on publish; `stop()` is all callers need.
+
+    def stop(self):
+        for channel, handler in self._handlers.items():
+            self._client._subscribers[channel].remove(handler)
+        self._handlers = {}
+
+class InMemoryBus(RedisBus):
+    """A `RedisBus` whose client is given instead of connected: InMemoryRedis or a fakeredis client."""
+    def __init__(self, redis_client=None):
+        super().__init__(redis_client or InMemoryRedis())
+
+def create_bus(kind: str) -> RedisBus:
+    """"memory" (in-process), "fakeredis" (requires the fakeredis package) or "redis" (REDIS_HOST)."""
+    if kind == "memory":
+        return InMemoryBus()
+    if kind == "fakeredis":
+        try:
+            import fakeredis
+        except ImportError:
+            raise SystemExit("The fakeredis bus needs `pip install fakeredis`.")
+        return InMemoryBus(fakeredis.FakeRedis())
+    if kind == "redis":
+        return RedisBus()
+    raise ValueError(f"Unknown bus: {kind}")
+
+# --- Models ---
+
+def _stable_hash(token: str) -> int:
+    return zlib.crc32(token.encode("utf-8"))
+
+class HashingEmbedder:
+    """Bag-of-words vectors via the hashing trick; texts sharing words land close together."""
+    def __init__(self, seconds_per_text: float = 0.0):
+        self.seconds_per_text = seconds_per_text
+
+    def encode(self, texts, batch_size=None, convert_to_tensor=False):
+        if self.seconds_per_text:
+            time.sleep(self.seconds_per_text * len(texts))
+        vectors = np.zeros((len(texts), EMBEDDING_DIM), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                digest = _stable_hash(token)
+                vectors[row, digest % EMBEDDING_DIM] += 1.0 if digest & 1 << 16 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+class OverlapReranker:
+    """Scores a (query, passage) pair by the share of query terms found in the passage."""
+    def __init__(self, seconds_per_pair: float = 0.0):
+        self.seconds_per_pair = seconds_per_pair
+
+    def predict(self, pairs, batch_size=None):
+        if self.seconds_per_pair:
+            time.sleep(self.seconds_per_pair * len(pairs))
+        scores = []
+        for query, passage in pairs:
+            query_terms, passage_terms = set(tokenize(query)), set(tokenize(passage))
+            scores.append(len(query_terms & passage_terms) / len(query_terms) if query_terms else 0.0)
+        return np.array(scores, dtype=np.float32)
+
+class FakeLLM:
+    """Mimics the ctransformers calls LocalInference makes, charging a fixed time per whitespace-separated token."""
+    def __init__(self, seconds_per_token: float = 0.02, prompt_seconds_per_token: float = 0.0005,
+                 answer_tokens: int = 64):
+        self.seconds_per_token = seconds_per_token
+        self.prompt_seconds_per_token = prompt_seconds_per_token
+        self.answer_tokens = answer_tokens
+
+    def tokenize(self, text, add_bos_token=True):
+        tokens = [_stable_hash(word) % 32000 for word in text.split()]
+        return [1] + tokens if add_bos_token else tokens
+
+    def detokenize(self, tokens, decode=True):
+        text = "".join(f" word{token}" for token in tokens)
+        return text if decode else text.encode("utf-8")
+
+    def reset(self):
+        pass
+
+    def eval(self, tokens):
+        time.sleep(self.prompt_seconds_per_token * len(tokens))
+
+    def generate(self, tokens, temperature=0.7, reset=True):
+        self.eval(tokens)
+        for index in range(self.answer_tokens):
+            time.sleep(self.seconds_per_token)
+            yield index
+
+class BenchmarkInference(LocalInference):
+    """LocalInference with the components named in `fake_models` swapped for the fakes above."""
+    def __init__(self, fake_models=("embedding", "reranker", "llm"), embedder=None, reranker=None, llm=None):
+        super().__init__()
+        fakes = {
+            "embedding": lambda: embedder or HashingEmbedder(),
+            "reranker": lambda: reranker or OverlapReranker(),
+            "llm": lambda: llm or FakeLLM(),
+        }
+        for component in fake_models:
+            self._loaders[component] = fakes[component]
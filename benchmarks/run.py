@@ -0,0 +1,293 @@
+# benchmarks/run.py
+
+"""Measures ingestion throughput, retrieval latency and end-to-end QPS as the corpus grows."""
+
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+def percentile(values: list[float], q: float) -> float | None:
+    """Nearest-rank percentile."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+def _latency_summary(seconds: list[float]) -> dict:
+    milliseconds = [value * 1000 for value in seconds]
+    return {
+        "p50_ms": percentile(milliseconds, 50),
+        "p99_ms": percentile(milliseconds, 99),
+        "mean_ms": sum(milliseconds) / len(milliseconds) if milliseconds else None,
+    }
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _configure_scratch_dirs(workdir: str):
+    """Points every persistent store at `workdir`. Must run before the repo modules are imported."""
+    os.environ["VECTOR_STORE_DIR"] = os.path.join(workdir, "vector_store")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(workdir, "embeddings.sqlite3")
+    os.environ["BLOB_STORE_BACKEND"] = "file"
+    os.environ["BLOB_STORE_DIR"] = os.path.join(workdir, "blobs")
+    os.environ["WARM_UP_MODELS"] = "false"
+
+class BenchmarkHarness:
+    def __init__(self, bus, inference):
+        from client import RAGClient
+        from agents.ingestion_agent import IngestionAgent
+        from agents.retrieval_agent import RetrievalAgent
+        from agents.llm_response_agent import LLMResponseAgent
+
+        self.bus = bus
+        self.client = RAGClient(bus, name="Benchmark")
+        self.agents = {
+            "IngestionAgent": IngestionAgent(bus, processes=0),
+            "RetrievalAgent": RetrievalAgent(bus, inference),
+            "LLMResponseAgent": LLMResponseAgent(bus, inference),
+        }
+        self._workers = {}
+
+    def start_agent(self, name: str):
+        from agents.worker import _consume
+        from config import config
+        stop_event = threading.Event()
+        threads = [
+            threading.Thread(target=_consume, args=(self.agents[name], stop_event), name=f"bench-{name}-{i}", daemon=True)
+            for i in range(config.WORKER_CONCURRENCY.get(name, 1))
+        ]
+        for thread in threads:
+            thread.start()
+        self._workers[name] = (stop_event, threads)
+
+    def stop_agent(self, name: str):
+        stop_event, threads = self._workers.pop(name)
+        stop_event.set()
+        for thread in threads:
+            thread.join()
+
+    def close(self):
+        for name in list(self._workers):
+            self.stop_agent(name)
+        self.client.close()
+
+    def indexed_chunks(self) -> int:
+        vector_store = self.agents["RetrievalAgent"].vector_store
+        return vector_store.index.ntotal if vector_store is not None else 0
+
+    def ingest(self, paths: list[str], timeout: float) -> dict:
+        """Queues every file and waits until each one is indexed (or failed)."""
+        before = self.indexed_chunks()
+        names = [os.path.basename(path) for path in paths]
+        start = time.perf_counter()
+        for path, name in zip(paths, names):
+            self.client.ingest(path, name)
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            progress = self.client.progress()
+            done = [name for name in names if name in progress and (
+                progress[name]["stage"] == "failed" or (progress[name]["stage"] == "indexed" and progress[name]["last_batch"]))]
+            if len(done) == len(names):
+                break
+            time.sleep(0.01)
+        seconds = time.perf_counter() - start
+        failed = sum(self.client.progress().get(name, {}).get("stage") == "failed" for name in names)
+        chunks = self.indexed_chunks() - before
+        return {
+            "documents": len(names),
+            "failed": failed,
+            "timed_out": time.time() >= deadline,
+            "chunks": chunks,
+            "seconds": seconds,
+            "chunks_per_second": chunks / seconds if seconds else None,
+        }
+
+    def retrieve(self, queries: list[str], timeout: float) -> dict:
+        """Sequential RETRIEVE round trips, read straight off the LLMResponseAgent queue (its worker is stopped)."""
+        latencies, missing = [], 0
+        for index, query in enumerate(queries):
+            start = time.perf_counter()
+            self.bus.send({
+                "sender": "Benchmark",
+                "receiver": "RetrievalAgent",
+                "type": "RETRIEVE",
+                "trace_id": f"bench-retrieve-{index}",
+                "reply_to": self.client.reply_to,
+                "payload": {"query": query, "stream": False, "deadline": time.time() + timeout},
+            })
+            message = self.bus.receive("LLMResponseAgent", block=True, timeout=timeout)
+            if message is None:
+                missing += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+        return {"queries": len(queries), "missing": missing, **_latency_summary(latencies)}
+
+    def answer(self, queries: list[str], concurrency: int, timeout: float) -> dict:
+        """Full questions through RAGClient with `concurrency` callers in flight."""
+        def ask(query):
+            start = time.perf_counter()
+            try:
+                payload = self.client.ask(query, timeout=timeout)
+            except Exception:
+                return None, False
+            return time.perf_counter() - start, payload.get("cached", False)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(ask, queries))
+        seconds = time.perf_counter() - start
+        latencies = [latency for latency, _ in outcomes if latency is not None]
+        return {
+            "queries": len(queries),
+            "concurrency": concurrency,
+            "failed": len(queries) - len(latencies),
+            "cached": sum(cached for _, cached in outcomes),
+            "seconds": seconds,
+            "qps": len(latencies) / seconds if seconds else None,
+            **_latency_summary(latencies),
+        }
+
+def run(args, workdir: str) -> dict:
+    from benchmarks.fakes import create_bus, BenchmarkInference, HashingEmbedder, OverlapReranker, FakeLLM
+    from benchmarks.corpus import SyntheticCorpus
+
+    fake_models = [component for component in ("embedding", "reranker", "llm") if component not in args.real]
+    inference = BenchmarkInference(
+        fake_models,
+        embedder=HashingEmbedder(args.embed_latency_ms / 1000),
+        reranker=OverlapReranker(args.rerank_latency_ms / 1000),
+        llm=FakeLLM(args.token_latency_ms / 1000, args.prompt_latency_ms / 1000, args.answer_tokens),
+    )
+    inference.warm_up(background=False)
+    harness = BenchmarkHarness(create_bus(args.bus), inference)
+    corpus = SyntheticCorpus(seed=args.seed)
+    results = []
+    try:
+        harness.start_agent("IngestionAgent")
+        harness.start_agent("RetrievalAgent")
+        for size in args.sizes:
+            new_documents = size - corpus.documents_written
+            if new_documents <= 0:
+                continue
+            paths = corpus.write_documents(os.path.join(workdir, "documents"), new_documents)
+            ingest = harness.ingest(paths, args.timeout * new_documents)
+            retrieval = harness.retrieve(corpus.queries(args.retrieval_queries), args.timeout)
+
+            harness.start_agent("LLMResponseAgent")
+            end_to_end = harness.answer(corpus.queries(args.e2e_queries), args.e2e_concurrency, args.timeout)
+            harness.stop_agent("LLMResponseAgent")
+
+            result = {"documents": size, "chunks": harness.indexed_chunks(),
+                      "ingest": ingest, "retrieval": retrieval, "end_to_end": end_to_end}
+            results.append(result)
+            print(_format_result(result), flush=True)
+    finally:
+        harness.close()
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "bus": args.bus,
+            "fake_models": fake_models,
+            "settings": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "workdir")},
+            "startup": inference.load_times,
+        },
+        "results": results,
+    }
+
+def _format_result(result: dict) -> str:
+    def fmt(value, unit=""):
+        return "n/a" if value is None else f"{value:.1f}{unit}"
+    return (f"{result['documents']:>6} docs {result['chunks']:>7} chunks | "
+            f"ingest {fmt(result['ingest']['chunks_per_second'])} chunks/s | "
+            f"retrieval p50 {fmt(result['retrieval']['p50_ms'], 'ms')} p99 {fmt(result['retrieval']['p99_ms'], 'ms')} | "
+            f"end-to-end {fmt(result['end_to_end']['qps'])} QPS p99 {fmt(result['end_to_end']['p99_ms'], 'ms')}")
+
+# (section, metric, True if higher is better)
+COMPARED_METRICS = (
+    ("ingest", "chunks_per_second", True),
+    ("retrieval", "p50_ms", False),
+    ("retrieval", "p99_ms", False),
+    ("end_to_end", "qps", True),
+    ("end_to_end", "p99_ms", False),
+)
+
+def compare(current: dict, baseline: dict) -> str:
+    """Per-size changes against `baseline`; sizes missing from either run are skipped."""
+    baseline_by_size = {result["documents"]: result for result in baseline["results"]}
+    lines = [f"Compared with {baseline['meta'].get('commit') or 'baseline'}:"]
+    for result in current["results"]:
+        previous = baseline_by_size.get(result["documents"])
+        if previous is None:
+            continue
+        changes = []
+        for section, metric, higher_is_better in COMPARED_METRICS:
+            new, old = result[section].get(metric), previous[section].get(metric)
+            if not new or not old:
+                continue
+            change = (new - old) / old
+            better = change > 0 if higher_is_better else change < 0
+            changes.append(f"{section}.{metric} {change:+.1%}{'' if better or change == 0 else ' (worse)'}")
+        lines.append(f"  {result['documents']:>6} docs: " + ", ".join(changes))
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingestion, retrieval and answering.")
+    parser.add_argument("--sizes", type=lambda value: sorted(int(size) for size in value.split(",")),
+                        default=[25, 100, 400], help="Cumulative corpus sizes (documents) to measure at.")
+    parser.add_argument("--bus", choices=("memory", "fakeredis", "redis"), default="memory")
+    parser.add_argument("--real", type=lambda value: [part for part in value.split(",") if part], default=[],
+                        help="Comma-separated models to load for real: embedding, reranker, llm.")
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0, help="Fake embedder cost per text.")
+    parser.add_argument("--rerank-latency-ms", type=float, default=0.0, help="Fake reranker cost per pair.")
+    parser.add_argument("--token-latency-ms", type=float, default=5.0, help="Fake LLM cost per generated token.")
+    parser.add_argument("--prompt-latency-ms", type=float, default=0.05, help="Fake LLM cost per prompt token.")
+    parser.add_argument("--answer-tokens", type=int, default=64)
+    parser.add_argument("--retrieval-queries", type=int, default=100)
+    parser.add_argument("--e2e-queries", type=int, default=20)
+    parser.add_argument("--e2e-concurrency", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=60.0, help="Seconds allowed per document or query.")
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--workdir", default=None, help="Scratch directory (a temporary one is created and removed by default).")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", default=None, help="Earlier results file to compare against.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - [%(name)s:%(levelname)s] - %(message)s")
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)  # Read first: --output may name the same file.
+    workdir = args.workdir or tempfile.mkdtemp(prefix="rag-benchmark-")
+    _configure_scratch_dirs(workdir)
+    try:
+        report = run(args, workdir)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    if baseline is not None:
+        print(compare(report, baseline))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+"""Bulk-imports every supported document under a directory; a RetrievalAgent worker must be running to index them."""
+
+import time
+import argparse
+from message_bus import RedisBus
+from client import RAGClient
+from agents.ingestion_agent import IngestionAgent
+from utils.logging_config import setup_logging
+from config import config
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-import a directory of documents.")
+    parser.add_argument("directory")
+    parser.add_argument("--processes", type=int, default=config.INGESTION_PROCESSES,
+                        help="Parser processes (0 parses in this process).")
+    parser.add_argument("--wait", action="store_true", help="Wait until the RetrievalAgent has indexed every file.")
+    args = parser.parse_args()
+
+    setup_logging()
+    bus = RedisBus()
+    client = RAGClient(bus)
+    summaries = IngestionAgent(bus, processes=args.processes).ingest_directory(args.directory, reply_to=client.reply_to)
+
+    for summary in summaries:
+        status = f"FAILED ({summary['error']})" if summary["error"] else f"{summary['chunks']} chunks"
+        print(f"{summary['file_name']}: {status}")
+
+    if args.wait:
+        expected = {s["file_name"] for s in summaries if not s["error"] and s["chunks"]}
+        deadline = time.time() + config.CLIENT_REQUEST_TIMEOUT * max(1, len(expected))
+        while time.time() < deadline:
+            done = {
+                document_id for document_id, update in client.progress().items()
+                if update["stage"] == "failed" or (update["stage"] == "indexed" and update["last_batch"])
+            }
+            if expected <= done:
+                print(f"All {len(expected)} document(s) indexed.")
+                break
+            time.sleep(1)
+        else:
+            print("Timed out waiting for the RetrievalAgent to index every document.")
+    client.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+# client.py
+
+import time
+import uuid
+import queue
+import asyncio
+import threading
+from concurrent.futures import Future, InvalidStateError
+from message_bus import RedisBus
+from utils.tracing import tracer
+from utils.logging_config import logger
+from config import config
+
+class RAGRequest:
+    """An in-flight question: a future for the final answer plus, when streaming, its tokens."""
+    def __init__(self, trace_id: str, deadline: float, stream: bool):
+        self.trace_id = trace_id
+        self.deadline = deadline
+        self.submitted_at = time.time()
+        self.first_token_at = None
+        self.future = Future()
+        self._events = queue.Queue() if stream else None
+
+    def result(self, timeout: float | None = None) -> dict:
+        """Blocks until the LLM_RESPONSE payload arrives."""
+        return self.future.result(timeout)
+
+    def tokens(self):
+        """Yields streamed text pieces until the final response (or an error) arrives."""
+        if self._events is None:
+            raise ValueError("Request was not submitted with stream=True.")
+        while True:
+            remaining = max(0.0, self.deadline - time.time())
+            try:
+                piece = self._events.get(timeout=remaining)
+            except queue.Empty:
+                return
+            if piece is None:
+                return
+            yield piece
+
+    def cancel(self) -> bool:
+        cancelled = self.future.cancel()
+        if cancelled and self._events is not None:
+            self._events.put(None)
+        return cancelled
+
+    def _push_token(self, text: str):
+        if self._events is not None:
+            self._events.put(text)
+
+    def _finish(self, payload: dict | None = None, error: Exception | None = None):
+        try:
+            if error:
+                self.future.set_exception(error)
+            else:
+                self.future.set_result(payload)
+        except InvalidStateError:
+            pass  # Already cancelled or expired.
+        # Resolve the future first so a token consumer sees the result once the stream ends.
+        if self._events is not None:
+            self._events.put(None)
+
+class RAGClient:
+    """Asks questions over the bus and routes each reply on a private queue back to its caller by trace_id."""
+    def __init__(self, bus: RedisBus, name: str = "Coordinator"):
+        self.bus = bus
+        self.reply_to = f"{name}:{uuid.uuid4().hex}"
+        self._pending: dict[str, RAGRequest] = {}
+        # Latest INGEST_PROGRESS payload per document; written by the listener, read through `progress()`.
+        self._ingest_progress: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._listener = threading.Thread(target=self._listen, name=f"{self.reply_to}-listener", daemon=True)
+        self._listener.start()
+
+    def submit(self, query: str, stream: bool = False, timeout: float = config.CLIENT_REQUEST_TIMEOUT,
+               priority: str = "interactive") -> RAGRequest:
+        """Sends a RETRIEVE request and returns its RAGRequest handle; "batch" priority waits behind "interactive"."""
+        request = RAGRequest(str(uuid.uuid4()), time.time() + timeout, stream)
+        with self._lock:
+            self._pending[request.trace_id] = request
+        request.future.add_done_callback(lambda _: self._forget(request.trace_id))
+
+        self.bus.send({
+            "sender": "Coordinator",
+            "receiver": "RetrievalAgent",
+            "type": "RETRIEVE",
+            "trace_id": request.trace_id,
+            "reply_to": self.reply_to,
+            "payload": {"query": query, "stream": stream, "deadline": request.deadline, "priority": priority}
+        })
+        return request
+
+    def ingest(self, file_path: str, file_name: str) -> str:
+        """Queues a file for ingestion; progress shows up in `progress()`. Returns the trace_id."""
+        return self._send_document("IngestionAgent", "INGEST", {"file_path": file_path, "file_name": file_name})
+
+    def update(self, file_path: str, file_name: str) -> str:
+        """Replaces the indexed document `file_name` with a new version; unchanged chunks are kept."""
+        return self._send_document("IngestionAgent", "UPDATE_DOCUMENT", {"file_path": file_path, "file_name": file_name})
+
+    def delete(self, document_id: str) -> str:
+        """Removes a document from the index; completion is reported in `progress()`."""
+        return self._send_document("RetrievalAgent", "DELETE_DOCUMENT", {"document_id": document_id})
+
+    def progress(self) -> dict[str, dict]:
+        """A snapshot of the latest ingestion progress per document, safe to iterate while updates arrive."""
+        with self._lock:
+            return dict(self._ingest_progress)
+
+    def _send_document(self, receiver: str, message_type: str, payload: dict) -> str:
+        trace_id = str(uuid.uuid4())
+        self.bus.send({
+            "sender": "Coordinator",
+            "receiver": receiver,
+            "type": message_type,
+            "trace_id": trace_id,
+            "reply_to": self.reply_to,
+            "payload": payload
+        })
+        return trace_id
+
+    def ask(self, query: str, timeout: float = config.CLIENT_REQUEST_TIMEOUT, priority: str = "interactive") -> dict:
+        """Synchronously asks a question and returns the LLM_RESPONSE payload."""
+        return self.submit(query, timeout=timeout, priority=priority).result()
+
+    async def ask_async(self, query: str, timeout: float = config.CLIENT_REQUEST_TIMEOUT,
+                        priority: str = "interactive") -> dict:
+        """Awaitable variant of `ask`; cancelling the awaiting task cancels the request."""
+        request = self.submit(query, timeout=timeout, priority=priority)
+        return await asyncio.wrap_future(request.future)
+
+    def cancel(self, trace_id: str) -> bool:
+        with self._lock:
+            request = self._pending.get(trace_id)
+        return request.cancel() if request else False
+
+    def close(self):
+        self._closed.set()
+        self._listener.join(timeout=config.WORKER_POLL_TIMEOUT + 1)
+        with self._lock:
+            pending = list(self._pending.values())
+        for request in pending:
+            request._finish(error=ConnectionError("RAGClient was closed."))
+
+    def _forget(self, trace_id: str):
+        with self._lock:
+            self._pending.pop(trace_id, None)
+
+    def _listen(self):
+        while not self._closed.is_set():
+            # Streamed tokens arrive in bursts; take everything already queued in one round trip.
+            for message in self.bus.receive_many(self.reply_to, block=True, timeout=config.WORKER_POLL_TIMEOUT):
+                self._dispatch(message)
+            self._expire()
+
+    def _dispatch(self, message: dict):
+        if message["type"] == "INGEST_PROGRESS":
+            payload = {**message["payload"], "trace_id": message["trace_id"]}
+            with self._lock:
+                previous = self._ingest_progress.get(payload["document_id"])
+                # Batches may be indexed out of order by several replicas; completion is sticky
+                # until a new operation (an update or delete) on the same document starts.
+                if not (previous and previous["trace_id"] == payload["trace_id"]
+                        and previous["stage"] == "indexed" and previous["last_batch"]):
+                    self._ingest_progress[payload["document_id"]] = payload
+            return
+        with self._lock:
+            request = self._pending.get(message.get("trace_id"))
+        if request is None:
+            # Late reply for a request that was cancelled or timed out.
+            logger.debug(f"Dropping reply for unknown trace {message.get('trace_id')}.")
+            return
+        now = time.time()
+        if message["type"] == "LLM_TOKEN":
+            if request.first_token_at is None:
+                request.first_token_at = now
+                tracer.record_span("client.first_token", request.submitted_at, now - request.submitted_at,
+                                   trace_id=request.trace_id)
+            request._push_token(message["payload"]["text"])
+        elif message["type"] == "LLM_RESPONSE":
+            tracer.record_span("client.request", request.submitted_at, now - request.submitted_at,
+                               trace_id=request.trace_id, cached=message["payload"].get("cached", False))
+            request._finish(message["payload"])
+
+    def _expire(self):
+        now = time.time()
+        with self._lock:
+            expired = [request for request in self._pending.values() if request.deadline <= now]
+        for request in expired:
+            request._finish(error=TimeoutError(f"No answer for trace {request.trace_id} before its deadline."))
@@ -1,7 +1,6 @@
 # config.py
 
 import os
-import torch
 
 class Config:
     # --- Model Configuration ---
@@ -14,20 +13,117 @@ class Config:
     
     # THE FINAL, CORRECT FILENAME with case-sensitivity and period fix.
     LLM_MODEL_FILE = "mistral-7b-instruct-v0.2.Q4_K_M.gguf"
+    LLM_CONTEXT_LENGTH = 4096
+    LLM_MAX_NEW_TOKENS = 512
+    LLM_PREFIX_REUSE = True  # Keep the system prompt evaluated between requests
+    LLM_MMAP = True  # Memory-map the GGUF weights instead of reading them into memory up front
 
     MODEL_CACHE_DIR = "models"
-    DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+    EMBEDDING_MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", 64))
+    EMBEDDING_MAX_WAIT_MS = float(os.getenv("EMBEDDING_MAX_WAIT_MS", 5))  # How long a partial batch waits for more texts
+    EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join("cache", "embeddings.sqlite3"))
+    EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 200_000))
+    # "torch" runs the embedder and reranker with sentence-transformers; "onnx" exports them once
+    # to int8 ONNX Runtime graphs (CPU only, needs onnxruntime and onnx installed).
+    MODEL_BACKEND = os.getenv("MODEL_BACKEND", "torch")
+    ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", 0))  # 0 lets ONNX Runtime decide
+    # Resolved on first access so importing the config doesn't pull in torch; set DEVICE to skip detection.
+    _device = os.getenv("DEVICE")
+    WARM_UP_MODELS = os.getenv("WARM_UP_MODELS", "true").lower() == "true"  # Load models in the background at startup
+
+    @property
+    def DEVICE(self):
+        if self._device is None:
+            import torch
+            self._device = "cuda" if torch.cuda.is_available() else "cpu"
+        return self._device
+
+    def llm_threads_per_slot(self) -> int:
+        return self.LLM_THREADS_PER_SLOT or max(1, (os.cpu_count() or 1) // self.LLM_PARALLEL_SLOTS)
     
     # --- RAG Configuration ---
     CHUNK_SIZE = 1000
     CHUNK_OVERLAP = 200
     INITIAL_RETRIEVAL_K = 10
     FINAL_RETRIEVAL_K = 3
+    RERANK_EARLY_EXIT_MARGIN = 0.2  # Dense cosine gap after the top FINAL_RETRIEVAL_K that skips the cross-encoder
+    RERANK_CACHE_MAX_ENTRIES = 50_000
+    RERANK_MAX_BATCH_PAIRS = 64
+    RERANK_MAX_WAIT_MS = 5
+    HYBRID_RETRIEVAL = True  # Fuse BM25 candidates with dense ones via reciprocal-rank fusion
+    LEXICAL_RETRIEVAL_K = 10
+    RRF_K = 60
+    BM25_K1 = 1.5
+    BM25_B = 0.75
+    MIN_DEDUP_OVERLAP = 20  # Shortest repeated text (chars) trimmed between overlapping chunks in the prompt
+    INGEST_BATCH_CHUNKS = 64  # Chunks per ADD_DOCUMENT message while a document is streamed in
+    INGESTION_PROCESSES = int(os.getenv("INGESTION_PROCESSES", 0))  # Parser processes; 0 parses inline
+
+    # --- Vector Index Engine ---
+    VECTOR_INDEX_MODE = os.getenv("VECTOR_INDEX_MODE", "flat")  # "flat", "hnsw" or "ivfpq"
+    ANN_MIGRATION_THRESHOLD = 20_000  # Vectors before a flat index is rebuilt as VECTOR_INDEX_MODE
+    ANN_TRAINING_SAMPLE = 50_000
+    ANN_MIN_RECALL = 0.8  # Required recall@INITIAL_RETRIEVAL_K against exact search, or the flat index is kept
+    ANN_RECALL_QUERIES = 200
+    HNSW_M = 32
+    HNSW_EF_CONSTRUCTION = 200
+    HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", 64))
+    IVF_NLIST = 1024
+    IVF_NPROBE = int(os.getenv("IVF_NPROBE", 16))
+    PQ_M = 48  # Sub-quantizers; must divide the embedding dimension (384 for all-MiniLM-L6-v2)
+    PQ_NBITS = 8
+
+    # --- Semantic Answer Cache ---
+    ANSWER_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", 0.95))
+    ANSWER_CACHE_TTL_SECONDS = 3600
+    ANSWER_CACHE_MAX_ENTRIES = 512
+    ANSWER_CACHE_CHANNEL = "answer_cache"  # Pub/sub channel that fills every RetrievalAgent replica's cache
+
+    # --- Generation Streaming ---
+    LLM_STREAM_CHUNK_TOKENS = 4  # Tokens coalesced into each LLM_TOKEN message after the first
+    CLIENT_REQUEST_TIMEOUT = 120  # Overall deadline for a RAGClient question, streamed or not
+
+    # --- Generation Scheduler ---
+    LLM_PARALLEL_SLOTS = int(os.getenv("LLM_PARALLEL_SLOTS", 1))  # Concurrent generations, each with its own model instance
+    LLM_THREADS_PER_SLOT = int(os.getenv("LLM_THREADS_PER_SLOT", 0))  # 0 splits the CPU cores evenly across slots
+    LLM_QUEUE_MAX = int(os.getenv("LLM_QUEUE_MAX", 16))  # Waiting generations before new ones are shed with a "busy" reply
+    LLM_CONSUMER_LOOKAHEAD = int(os.getenv("LLM_CONSUMER_LOOKAHEAD", 1))  # Messages a worker takes beyond its slots; the rest wait in Redis
+    LLM_PRIORITIES = ("interactive", "batch")  # Highest first; a full queue sheds the lowest-priority work
+    LLM_SERVICE_TIME_ESTIMATE = 10.0  # Seconds per generation assumed until real ones have been measured
+
+    # --- Vector Store Persistence ---
+    VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", "vector_store")
+    VECTOR_STORE_MAX_SEGMENTS = 16  # Incremental segments before folding them into a new base snapshot
+    VECTOR_STORE_KEEP_VERSIONS = 2  # Older manifests are kept so in-flight readers can finish
+    COMPACTION_INTERVAL_SECONDS = 300  # How often the RetrievalAgent checks whether to compact
+    COMPACTION_MIN_DELETED_RATIO = 0.2  # Share of deleted (tombstoned) vectors that triggers a rebuild
     
     # --- Message Bus Configuration (Redis) ---
     REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
     REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+    BUS_CODEC = os.getenv("BUS_CODEC", "json")  # "json" or "msgpack" (needs the msgpack package)
+    BUS_COMPRESS_THRESHOLD = int(os.getenv("BUS_COMPRESS_THRESHOLD", 4096))  # Encoded bytes above which messages are zlib-compressed; 0 disables
+    BUS_RECEIVE_BATCH = 64  # Most messages `receive_many` takes from a queue in one round trip
+
+    # --- Blob Store (out-of-band ADD_DOCUMENT payloads) ---
+    BLOB_STORE_BACKEND = os.getenv("BLOB_STORE_BACKEND", "redis")  # "redis" or "file" (a directory shared by all agents)
+    BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", os.path.join("cache", "blobs"))
+    BLOB_TTL_SECONDS = 24 * 3600
+    BLOB_SWEEP_INTERVAL_SECONDS = 600  # How often a file blob store deletes blobs older than BLOB_TTL_SECONDS
+    BLOB_INLINE_MAX_BYTES = 32 * 1024  # UTF-8 chunk text above this size is passed by reference (a full batch usually is)
+    BLOB_BATCH_CHUNKS = 128  # Chunks per stored blob, and per batch indexed by the RetrievalAgent
+
+    # --- Agent Workers ---
+    # When enabled, the UI only sends messages and agents run via `python -m agents.worker`.
+    EXTERNAL_WORKERS = os.getenv("EXTERNAL_WORKERS", "false").lower() == "true"
+    WORKER_POLL_TIMEOUT = 1  # Seconds a BLPOP waits before re-checking for shutdown
+    WORKER_CONCURRENCY = {"IngestionAgent": 1, "RetrievalAgent": 4, "LLMResponseAgent": 1}
     
+    # --- Tracing & Metrics ---
+    TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+    TRACE_FILE = os.getenv("TRACE_FILE")  # JSONL span export, e.g. "cache/traces.jsonl"; unset disables it
+    METRICS_PORT = int(os.getenv("METRICS_PORT", 0))  # Prometheus text endpoint; 0 disables it
+
     # --- Logging Configuration ---
     LOG_LEVEL = "INFO"
     LOG_FORMAT = '%(asctime)s - [%(name)s:%(levelname)s] - %(message)s'
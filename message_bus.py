@@ -1,19 +1,27 @@
+import time
 import redis
-import json
 import logging
+from utils.tracing import tracer
+from utils.message_codec import MessageCodec
 from config import config
 
 logger = logging.getLogger(__name__)
 
+QUEUE_PREFIX = "queue:"
+
 class RedisBus:
     """A scalable message bus using Redis lists for queueing."""
-    def __init__(self):
+    def __init__(self, redis_client=None, codec: MessageCodec | None = None):
+        self.codec = codec or MessageCodec()
+        if redis_client is not None:
+            self.redis_client = redis_client
+            return
         try:
             self.redis_client = redis.Redis(
                 host=config.REDIS_HOST,
                 port=config.REDIS_PORT,
                 db=0,
-                decode_responses=True
+                decode_responses=False  # Messages are codec frames, not text
             )
             self.redis_client.ping()
             logger.info(f"Successfully connected to Redis at {config.REDIS_HOST}:{config.REDIS_PORT}")
@@ -23,30 +31,130 @@ class RedisBus:
 
     def send(self, message: dict):
         """Sends a message to a specific agent's queue."""
-        receiver_queue = f"queue:{message['receiver']}"
+        receiver_queue = f"{QUEUE_PREFIX}{message['receiver']}"
+        # Lets the receiver measure queue wait; wall-clock because sender and receiver may be different processes.
+        message["sent_at"] = time.time()
         try:
-            self.redis_client.rpush(receiver_queue, json.dumps(message))
+            depth = self.redis_client.rpush(receiver_queue, self.codec.encode(message))
+            self._sent([message], {message["receiver"]: depth})
             logger.debug(f"Sent message to {receiver_queue}: {message.get('type')}")
         except Exception as e:
             logger.error(f"Failed to send message to {receiver_queue}: {e}")
 
+    def send_many(self, messages: list[dict]):
+        """Sends several messages in one round trip. Messages for the same queue keep their order."""
+        if not messages:
+            return
+        payloads: dict[str, list[bytes]] = {}
+        sent_at = time.time()
+        try:
+            for message in messages:
+                message["sent_at"] = sent_at
+                payloads.setdefault(message["receiver"], []).append(self.codec.encode(message))
+            pipe = self.redis_client.pipeline(transaction=False)
+            for receiver, encoded in payloads.items():
+                pipe.rpush(f"{QUEUE_PREFIX}{receiver}", *encoded)
+            self._sent(messages, dict(zip(payloads, pipe.execute())))
+            logger.debug(f"Sent {len(messages)} messages to {len(payloads)} queue(s)")
+        except Exception as e:
+            logger.error(f"Failed to send {len(messages)} messages to {', '.join(payloads)}: {e}")
+
+    def _sent(self, messages: list[dict], depths: dict[str, int]):
+        for message in messages:
+            tracer.increment("bus_messages_sent_total", type=message.get("type"))
+        for receiver, depth in depths.items():
+            # Reply queues are per client ("Coordinator:<id>"), so they are reported under their prefix.
+            tracer.set_gauge("bus_queue_depth", depth, queue=receiver.split(":")[0])
+
     def receive(self, agent_name: str, block: bool = True, timeout: int = 5) -> dict | None:
         """Receives a message from an agent's queue."""
-        agent_queue = f"queue:{agent_name}"
+        agent_queue = f"{QUEUE_PREFIX}{agent_name}"
         try:
             if block:
                 message = self.redis_client.blpop(agent_queue, timeout=timeout)
                 if message:
-                    return json.loads(message[1]) # blpop returns a tuple (queue_name, message)
+                    return self._received(self.codec.decode(message[1])) # blpop returns a tuple (queue_name, message)
             else:
                 message = self.redis_client.lpop(agent_queue)
                 if message:
-                    return json.loads(message)
+                    return self._received(self.codec.decode(message))
         except Exception as e:
             logger.error(f"Failed to receive message from {agent_queue}: {e}")
         return None
 
+    def receive_many(self, agent_name: str, max_messages: int = config.BUS_RECEIVE_BATCH,
+                     block: bool = True, timeout: int = 5) -> list[dict]:
+        """Takes up to `max_messages` from an agent's queue in one round trip; `block` waits only for the first."""
+        agent_queue = f"{QUEUE_PREFIX}{agent_name}"
+        raw = []
+        try:
+            if block:
+                first = self.redis_client.blpop(agent_queue, timeout=timeout)
+                if not first:
+                    return []
+                raw.append(first[1])
+            if max_messages > len(raw):
+                # MULTI/EXEC, so no other consumer can pop between reading the range and trimming it.
+                pipe = self.redis_client.pipeline(transaction=True)
+                pipe.lrange(agent_queue, 0, max_messages - len(raw) - 1)
+                pipe.ltrim(agent_queue, max_messages - len(raw), -1)
+                raw.extend(pipe.execute()[0])
+        except Exception as e:
+            logger.error(f"Failed to receive messages from {agent_queue}: {e}")
+        return [message for _, message in self._decode_all((agent_name, data) for data in raw)]
+
+    def receive_any(self, agent_names: list[str]) -> list[tuple[str, dict]]:
+        """Pops the head of several agents' queues in one round trip, without blocking; returns (agent_name, message) pairs."""
+        queues = [f"{QUEUE_PREFIX}{name}" for name in agent_names]
+        raw = []
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for queue in queues:
+                pipe.lpop(queue)
+            raw = [(name, data) for name, data in zip(agent_names, pipe.execute()) if data is not None]
+        except Exception as e:
+            logger.error(f"Failed to receive messages from {', '.join(queues)}: {e}")
+        return list(self._decode_all(raw))
+
+    def _decode_all(self, raw):
+        """Decodes (agent_name, data) pairs, skipping messages that can't be decoded."""
+        for agent_name, data in raw:
+            try:
+                yield agent_name, self._received(self.codec.decode(data))
+            except Exception as e:
+                logger.error(f"Dropping undecodable message from {QUEUE_PREFIX}{agent_name}: {e}")
+
+    def _received(self, message: dict) -> dict:
+        """Records how long the message sat in its queue."""
+        sent_at = message.get("sent_at")
+        if sent_at is not None:
+            wait = time.time() - sent_at
+            tracer.observe("bus_queue_wait_seconds", wait, type=message.get("type"))
+            tracer.record_span("bus.queue_wait", sent_at, wait, trace_id=message.get("trace_id"),
+                               type=message.get("type"), receiver=message.get("receiver"))
+        return message
+
+    def publish(self, channel: str, message: dict):
+        """Broadcasts a message to every current subscriber of `channel`; nobody listening means it is lost."""
+        try:
+            self.redis_client.publish(f"channel:{channel}", self.codec.encode(message))
+            tracer.increment("bus_messages_sent_total", type=message.get("type"))
+        except Exception as e:
+            logger.error(f"Failed to publish to channel:{channel}: {e}")
+
+    def subscribe(self, channel: str, handler):
+        """Calls `handler(message)` from a background thread for each message published to `channel`."""
+        def on_message(item):
+            try:
+                handler(self.codec.decode(item["data"]))
+            except Exception as e:
+                logger.error(f"Failed to handle a message from channel:{channel}: {e}", exc_info=True)
+
+        pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{f"channel:{channel}": on_message})
+        return pubsub.run_in_thread(sleep_time=config.WORKER_POLL_TIMEOUT, daemon=True)
+
     def is_empty(self, agent_name: str) -> bool:
         """Checks if an agent's queue is empty."""
-        agent_queue = f"queue:{agent_name}"
-        return self.redis_client.llen(agent_queue) == 0
\ No newline at end of file
+        agent_queue = f"{QUEUE_PREFIX}{agent_name}"
+        return self.redis_client.llen(agent_queue) == 0
@@ -0,0 +1,44 @@
+import os
+from utils.blob_store import FileBlobStore, pack_chunks, iter_chunk_batches
+from config import config
+
+def test_small_batches_stay_inline(tmp_path):
+    payload = pack_chunks(FileBlobStore(str(tmp_path)), ["short chunk"], [{"page": 1}])
+    assert payload == {"chunks": ["short chunk"], "metadatas": [{"page": 1}]}
+
+def test_limit_counts_utf8_bytes_not_characters(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "BLOB_INLINE_MAX_BYTES", 100)
+    chunks = ["é" * 60]  # 60 characters, 120 bytes
+    payload = pack_chunks(FileBlobStore(str(tmp_path)), chunks, [{}])
+    assert "chunk_refs" in payload
+
+def test_large_batches_round_trip_by_reference(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "BLOB_INLINE_MAX_BYTES", 100)
+    monkeypatch.setattr(config, "BLOB_BATCH_CHUNKS", 2)
+    store = FileBlobStore(str(tmp_path))
+    chunks = [f"chunk {i} " + "x" * 50 for i in range(5)]
+    metadatas = [{"index": i} for i in range(5)]
+
+    payload = pack_chunks(store, chunks, metadatas)
+    assert [ref["count"] for ref in payload["chunk_refs"]] == [2, 2, 1]
+
+    batches = list(iter_chunk_batches(store, payload))
+    assert [chunk for batch, _ in batches for chunk in batch] == chunks
+    assert [meta for _, batch in batches for meta in batch] == metadatas
+    assert os.listdir(tmp_path) == []  # Consumed blobs are deleted.
+
+def test_identical_payloads_get_separate_blobs(tmp_path):
+    store = FileBlobStore(str(tmp_path))
+    first, second = store.put(b"same bytes"), store.put(b"same bytes")
+    assert first != second
+    store.delete(first)
+    assert store.get(second) == b"same bytes"
+
+def test_expired_blobs_are_swept(tmp_path):
+    store = FileBlobStore(str(tmp_path), ttl=60)
+    stale = store.put(b"left behind by a crashed consumer")
+    old = os.path.getmtime(tmp_path / stale) - 120
+    os.utime(tmp_path / stale, (old, old))
+    store._last_sweep = 0.0
+    fresh = store.put(b"new")
+    assert sorted(os.listdir(tmp_path)) == [fresh]
@@ -0,0 +1,31 @@
+from utils.context_packing import CONTEXT_SEPARATOR, pack_context
+from config import config
+
+def count_words(text: str) -> int:
+    return len(text.split())
+
+def test_chunks_are_joined_in_order_within_budget():
+    chunks = ["one two three", "four five", "six seven eight nine"]
+    packed = pack_context(chunks, count_words, budget=100)
+    assert packed == CONTEXT_SEPARATOR.join(chunks)
+
+def test_chunk_that_does_not_fit_is_skipped_for_a_shorter_one():
+    chunks = ["a b c", "d e f g h i j k", "l m"]
+    # Separator "---" counts as one word.
+    assert pack_context(chunks, count_words, budget=7) == CONTEXT_SEPARATOR.join(["a b c", "l m"])
+
+def test_only_the_first_chunk_is_truncated():
+    packed = pack_context(["w " * 50, "short"], count_words, budget=10)
+    assert count_words(packed) <= 10
+    assert "short" not in packed
+
+def test_duplicates_and_contained_chunks_are_skipped():
+    chunks = ["alpha beta gamma delta", "beta gamma", "alpha beta gamma delta"]
+    assert pack_context(chunks, count_words, budget=100) == "alpha beta gamma delta"
+
+def test_overlap_with_a_neighbouring_chunk_is_stripped(monkeypatch):
+    monkeypatch.setattr(config, "MIN_DEDUP_OVERLAP", 5)
+    overlap = "shared overlap text"
+    first, second = f"The beginning {overlap}", f"{overlap} and the end"
+    packed = pack_context([first, second], count_words, budget=100)
+    assert packed == CONTEXT_SEPARATOR.join([first, "and the end"])
@@ -0,0 +1,40 @@
+from types import SimpleNamespace
+from utils.document_registry import DocumentRegistry, chunk_hash
+
+def _entry(doc_id, document_id, text):
+    return doc_id, SimpleNamespace(metadata={"document_id": document_id, "chunk_hash": chunk_hash(text)})
+
+def _registry():
+    return DocumentRegistry.from_entries([
+        _entry("1", "report.pdf", "intro"),
+        _entry("2", "report.pdf", "body"),
+        _entry("3", "notes.txt", "todo"),
+        ("4", SimpleNamespace(metadata={})),  # Indexed before documents were tracked.
+    ])
+
+def test_chunks_are_grouped_by_document():
+    registry = _registry()
+    assert registry.chunk_hashes("report.pdf") == {chunk_hash("intro"), chunk_hash("body")}
+    assert sorted(registry.chunk_ids("report.pdf")) == ["1", "2"]
+    assert registry.chunk_ids("report.pdf", exclude_hashes=[chunk_hash("intro")]) == ["2"]
+    assert registry.chunk_ids("missing.pdf") == []
+
+def test_remove_tombstones_ids_and_forgets_empty_documents():
+    registry = _registry()
+    registry.remove(["3", "4"])
+    assert registry.tombstones == {"3", "4"}
+    assert "notes.txt" not in registry.documents
+    registry.remove(["1"])
+    assert registry.chunk_ids("report.pdf") == ["2"]
+
+def test_tombstones_given_at_load_are_applied():
+    registry = DocumentRegistry.from_entries([_entry("1", "a", "x"), _entry("2", "a", "y")], tombstones=["1"])
+    assert registry.chunk_ids("a") == ["2"]
+    assert registry.tombstones == {"1"}
+
+def test_clear_tombstones_keeps_live_chunks():
+    registry = _registry()
+    registry.remove(["1"])
+    registry.clear_tombstones()
+    assert registry.tombstones == set()
+    assert registry.chunk_ids("report.pdf") == ["2"]
@@ -0,0 +1,81 @@
+import time
+import threading
+import pytest
+from utils.generation_scheduler import GenerationScheduler, SchedulerBusy, DeadlineExpired
+
+def _blocked_scheduler(**kwargs):
+    """A one-slot scheduler whose slot is held until the returned event is set."""
+    scheduler = GenerationScheduler(slots=1, **kwargs)
+    release, started = threading.Event(), threading.Event()
+    def hold(slot):
+        started.set()
+        release.wait(5)
+    scheduler.submit(hold)
+    assert started.wait(5)
+    return scheduler, release
+
+def test_jobs_run_by_priority_then_deadline():
+    scheduler, release = _blocked_scheduler(max_queue=10)
+    order = []
+    now = time.time()
+    futures = [
+        scheduler.submit(lambda slot: order.append("batch"), priority="batch"),
+        scheduler.submit(lambda slot: order.append("late"), deadline=now + 60),
+        scheduler.submit(lambda slot: order.append("early"), deadline=now + 30),
+    ]
+    release.set()
+    for future in futures:
+        future.result(timeout=5)
+    assert order == ["early", "late", "batch"]
+
+def test_result_and_slot_are_passed_through():
+    scheduler = GenerationScheduler(slots=1, max_queue=10)
+    assert scheduler.submit(lambda slot: ("done", slot)).result(timeout=5) == ("done", 0)
+
+def test_full_queue_refuses_an_equal_or_lower_newcomer():
+    scheduler, release = _blocked_scheduler(max_queue=1)
+    queued = scheduler.submit(lambda slot: "queued", priority="interactive")
+    refused = scheduler.submit(lambda slot: "refused", priority="batch")
+    with pytest.raises(SchedulerBusy):
+        refused.result(timeout=5)
+    release.set()
+    assert queued.result(timeout=5) == "queued"
+
+def test_full_queue_sheds_the_worst_job_for_a_higher_priority_one():
+    scheduler, release = _blocked_scheduler(max_queue=1)
+    shed = scheduler.submit(lambda slot: "shed", priority="batch")
+    admitted = scheduler.submit(lambda slot: "admitted", priority="interactive")
+    with pytest.raises(SchedulerBusy):
+        shed.result(timeout=5)
+    release.set()
+    assert admitted.result(timeout=5) == "admitted"
+
+def test_job_that_cannot_start_in_time_is_refused():
+    scheduler, release = _blocked_scheduler(max_queue=10)
+    scheduler._service_time = 60
+    future = scheduler.submit(lambda slot: "late", deadline=time.time() + 1)
+    with pytest.raises(SchedulerBusy):
+        future.result(timeout=5)
+    release.set()
+
+def test_deadline_passing_in_the_queue_drops_the_job():
+    scheduler, release = _blocked_scheduler(max_queue=10)
+    scheduler._service_time = 0  # Admit it; the held slot makes it wait past the deadline.
+    future = scheduler.submit(lambda slot: "late", deadline=time.time() + 0.05)
+    time.sleep(0.1)
+    release.set()
+    with pytest.raises(DeadlineExpired):
+        future.result(timeout=5)
+
+def test_shutdown_finishes_running_jobs_and_fails_queued_ones():
+    scheduler, release = _blocked_scheduler(max_queue=10)
+    queued = [scheduler.submit(lambda slot: "queued") for _ in range(2)]
+    threading.Timer(0.05, release.set).start()
+    scheduler.shutdown(wait=True)  # Returns only once the held job has finished.
+    assert release.is_set()
+    for future in queued:
+        with pytest.raises(SchedulerBusy):
+            future.result(timeout=5)
+    with pytest.raises(SchedulerBusy):
+        scheduler.submit(lambda slot: "late").result(timeout=5)
+    assert not any(thread.is_alive() for thread in scheduler._threads)
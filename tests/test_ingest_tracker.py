@@ -0,0 +1,73 @@
+import pytest
+from utils.ingest_tracker import IngestTracker
+
+class FakeRedis:
+    """The hash and pipeline commands IngestTracker uses, returning bytes like redis-py without decode_responses."""
+    def __init__(self):
+        self.hashes, self.ttls = {}, {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update({k.encode(): str(v).encode() for k, v in mapping.items()})
+        return len(mapping)
+
+    def hincrby(self, key, field, amount=1):
+        fields = self.hashes.setdefault(key, {})
+        fields[field.encode()] = str(int(fields.get(field.encode(), b"0")) + amount).encode()
+        return int(fields[field.encode()])
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def expire(self, key, seconds):
+        self.ttls[key] = seconds
+        return key in self.hashes
+
+    def delete(self, *keys):
+        return sum(self.hashes.pop(key, None) is not None for key in keys)
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client, self.commands = client, []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+@pytest.fixture
+def redis_client():
+    return FakeRedis()
+
+@pytest.fixture
+def tracker(redis_client):
+    return IngestTracker(redis_client, ttl=60)
+
+def test_completes_only_when_every_batch_is_indexed(tracker):
+    # The last batch finishes first; the document completes with the final earlier batch.
+    assert tracker.record("t", "doc", chunks=3, reused=1, batch_count=3, keep_hashes=["a", "b"]) is None
+    assert tracker.record("t", "doc", chunks=2, reused=0) is None
+    totals = tracker.record("t", "doc", chunks=4, reused=2)
+    assert totals == {"batches": 3, "chunks": 9, "reused": 3, "keep_hashes": ["a", "b"]}
+
+def test_last_batch_arriving_last_completes(tracker):
+    assert tracker.record("t", "doc", chunks=2, reused=0) is None
+    assert tracker.record("t", "doc", chunks=1, reused=0, batch_count=2, keep_hashes=[])["chunks"] == 3
+
+def test_single_batch_document_completes_immediately(tracker):
+    assert tracker.record("t", "doc", chunks=1, reused=0, batch_count=1)["keep_hashes"] is None
+
+def test_documents_and_traces_are_counted_separately(tracker):
+    assert tracker.record("t1", "doc", chunks=1, reused=0, batch_count=2) is None
+    assert tracker.record("t2", "doc", chunks=1, reused=0, batch_count=1) is not None
+    assert tracker.record("t1", "other", chunks=1, reused=0) is None
+    assert tracker.record("t1", "doc", chunks=1, reused=0) is not None
+
+def test_state_expires_and_is_removed_once_complete(tracker, redis_client):
+    tracker.record("t", "doc", chunks=1, reused=0)
+    assert redis_client.ttls["ingest:t:doc"] == 60
+    tracker.record("t", "doc", chunks=1, reused=0, batch_count=2)
+    assert "ingest:t:doc" not in redis_client.hashes
@@ -0,0 +1,42 @@
+from utils.lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+def _index():
+    index = BM25Index()
+    index.add(["a", "b", "c"], [
+        "error ERR-404 raised by the billing service",
+        "the billing service sends invoices",
+        "the weather is sunny today",
+    ])
+    return index
+
+def test_tokenize_keeps_compound_identifiers_and_their_parts():
+    assert tokenize("See ERR-404 now") == ["see", "err-404", "err", "404", "now"]
+
+def test_search_ranks_rare_term_matches_first():
+    index = _index()
+    assert [doc_id for doc_id, _ in index.search("ERR-404 billing", 3)] == ["a", "b"]
+    assert index.search("snow", 3) == []
+
+def test_add_ignores_known_ids():
+    index = _index()
+    index.add(["a"], ["something else entirely"])
+    assert len(index) == 3
+    assert index.search("something", 3) == []
+
+def test_remove_drops_postings_and_lengths():
+    index = _index()
+    index.remove(["a"], ["error ERR-404 raised by the billing service"])
+    assert len(index) == 2
+    assert index.search("ERR-404", 3) == []
+    assert "err-404" not in index.postings
+    assert index.total_length == sum(index.doc_lengths.values())
+    assert [doc_id for doc_id, _ in index.search("billing", 3)] == ["b"]
+
+def test_empty_index_returns_nothing():
+    assert BM25Index().search("anything", 5) == []
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["x", "y", "z"], ["y", "w"]], k=60)
+    assert fused[0] == "y"  # Ranked by both lists.
+    assert set(fused) == {"x", "y", "z", "w"}
+    assert fused.index("x") < fused.index("w")  # Rank 1 in one list beats rank 2.
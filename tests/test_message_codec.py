@@ -0,0 +1,36 @@
+import json
+import pytest
+from utils.message_codec import MessageCodec
+
+MESSAGE = {"sender": "Coordinator", "receiver": "RetrievalAgent", "type": "QUERY", "payload": {"query": "what is ingestion?"}}
+
+def test_json_round_trip():
+    codec = MessageCodec("json", compress_threshold=0)
+    data = codec.encode(MESSAGE)
+    assert data[:1] == b"j"
+    assert codec.decode(data) == MESSAGE
+
+def test_large_messages_are_compressed():
+    codec = MessageCodec("json", compress_threshold=64)
+    message = {**MESSAGE, "payload": {"chunks": ["lorem ipsum " * 50] * 4}}
+    data = codec.encode(message)
+    assert data[:1] == b"J"
+    assert len(data) < len(json.dumps(message))
+    assert codec.decode(data) == message
+
+def test_unframed_json_from_older_senders_is_accepted():
+    codec = MessageCodec("json")
+    assert codec.decode(json.dumps(MESSAGE)) == MESSAGE
+    assert codec.decode(json.dumps(MESSAGE).encode("utf-8")) == MESSAGE
+
+def test_unknown_frames_and_codecs_are_rejected():
+    with pytest.raises(ValueError):
+        MessageCodec("json").decode(b"x{}")
+    with pytest.raises(ValueError):
+        MessageCodec("pickle")
+
+def test_msgpack_frames_decode_with_any_codec():
+    pytest.importorskip("msgpack")
+    data = MessageCodec("msgpack", compress_threshold=0).encode(MESSAGE)
+    assert data[:1] == b"m"
+    assert MessageCodec("json").decode(data) == MESSAGE
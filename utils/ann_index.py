@@ -0,0 +1,106 @@
+# utils/ann_index.py
+
+import numpy as np
+import faiss
+from utils.logging_config import logger
+from config import config
+
+INDEX_MODES = ("flat", "hnsw", "ivfpq")
+
+def index_kind(index) -> str:
+    base = faiss.downcast_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(base, faiss.IndexIVF):
+        return "ivfpq"
+    return "flat"
+
+def build_index(dimension: int, mode: str, training_vectors=None):
+    """Creates an empty index of the given mode, training it on a sample when required."""
+    if mode == "flat":
+        return faiss.IndexFlatL2(dimension)
+    if mode == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, config.HNSW_M)
+        index.hnsw.efConstruction = config.HNSW_EF_CONSTRUCTION
+        return index
+    if mode == "ivfpq":
+        sample = _sample(training_vectors, config.ANN_TRAINING_SAMPLE)
+        # k-means wants roughly 39 training points per list; shrink nlist for small corpora.
+        nlist = max(1, min(config.IVF_NLIST, len(sample) // 39))
+        quantizer = faiss.IndexFlatL2(dimension)
+        index = faiss.IndexIVFPQ(quantizer, dimension, nlist, config.PQ_M, config.PQ_NBITS)
+        index.train(sample)
+        return index
+    raise ValueError(f"Unknown VECTOR_INDEX_MODE: {mode}")
+
+def apply_search_params(index):
+    """Sets the query-time accuracy/speed knobs, which are not reliably persisted with the index."""
+    base = faiss.downcast_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = config.HNSW_EF_SEARCH
+    elif isinstance(base, faiss.IndexIVF):
+        base.nprobe = config.IVF_NPROBE
+
+def compact_index(index, keep_positions):
+    """Returns an index of the same type holding only the vectors at `keep_positions`, renumbered from 0."""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()
+    vectors = index.reconstruct_n(0, index.ntotal)
+    compacted = faiss.clone_index(index)
+    compacted.reset()
+    if len(keep_positions):
+        compacted.add(vectors[np.asarray(keep_positions, dtype="int64")])
+    return compacted
+
+def recall_at_k(candidate_index, vectors, k: int, num_queries: int = config.ANN_RECALL_QUERIES) -> float:
+    """Fraction of the exact top-k neighbours that `candidate_index` also returns, over sampled queries."""
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    queries = _sample(vectors, num_queries)
+    _, truth = exact.search(queries, k)
+    _, found = candidate_index.search(queries, k)
+    overlaps = [len(set(t) & set(f)) / k for t, f in zip(truth, found)]
+    return float(np.mean(overlaps))
+
+def _sample(vectors, size: int):
+    if len(vectors) <= size:
+        return vectors
+    rng = np.random.default_rng(0)
+    return vectors[rng.choice(len(vectors), size, replace=False)]
+
+class IndexEngine:
+    """Chooses the FAISS index type and migrates a flat index to VECTOR_INDEX_MODE once it is large and accurate enough."""
+    def __init__(self, mode: str = config.VECTOR_INDEX_MODE):
+        if mode not in INDEX_MODES:
+            raise ValueError(f"Unknown VECTOR_INDEX_MODE: {mode}")
+        self.mode = mode
+        self._next_check = config.ANN_MIGRATION_THRESHOLD
+
+    def prepare(self, vector_store):
+        if vector_store is not None:
+            apply_search_params(vector_store.index)
+
+    def maybe_migrate(self, vector_store) -> bool:
+        """Returns True when the store's index was replaced and needs a fresh snapshot."""
+        index = vector_store.index
+        if self.mode == "flat" or index_kind(index) != "flat" or index.ntotal < self._next_check:
+            return False
+
+        vectors = index.reconstruct_n(0, index.ntotal)
+        candidate = build_index(index.d, self.mode, vectors)
+        candidate.add(vectors)
+        apply_search_params(candidate)
+
+        recall = recall_at_k(candidate, vectors, config.INITIAL_RETRIEVAL_K)
+        if recall < config.ANN_MIN_RECALL:
+            # Retry only after the corpus has doubled, rather than on every add.
+            self._next_check = index.ntotal * 2
+            logger.warning(f"Kept the flat index: {self.mode} reached recall@{config.INITIAL_RETRIEVAL_K} "
+                           f"of {recall:.3f}, below ANN_MIN_RECALL={config.ANN_MIN_RECALL}.")
+            return False
+
+        vector_store.index = candidate
+        logger.info(f"Migrated {index.ntotal} vectors from a flat index to {self.mode} "
+                    f"(recall@{config.INITIAL_RETRIEVAL_K} = {recall:.3f}).")
+        return True
@@ -0,0 +1,71 @@
+# utils/answer_cache.py
+
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+from config import config
+
+class SemanticAnswerCache:
+    """Caches final answers by query embedding so near-duplicate questions on the same index version skip the pipeline."""
+    def __init__(
+        self,
+        threshold: float = config.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+        ttl: float = config.ANSWER_CACHE_TTL_SECONDS,
+        max_entries: int = config.ANSWER_CACHE_MAX_ENTRIES,
+    ):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._next_key = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, query_vector, index_version: int) -> dict | None:
+        """Returns the cached {"answer", "sources"} for a similar query, or None."""
+        with self._lock:
+            self._expire(index_version)
+            if self._entries:
+                keys = list(self._entries)
+                matrix = np.stack([self._entries[key]["vector"] for key in keys])
+                similarities = matrix @ self._normalize(query_vector)
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self._entries.move_to_end(keys[best])
+                    self.hits += 1
+                    entry = self._entries[keys[best]]
+                    return {"answer": entry["answer"], "sources": entry["sources"]}
+            self.misses += 1
+            return None
+
+    def store(self, query_vector, index_version: int, answer: str, sources: list):
+        with self._lock:
+            self._expire(index_version)
+            self._entries[self._next_key] = {
+                "vector": self._normalize(query_vector),
+                "index_version": index_version,
+                "answer": answer,
+                "sources": sources,
+                "created_at": time.monotonic(),
+            }
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _expire(self, index_version: int):
+        """Drops entries that outlived the TTL or were answered against another index version."""
+        cutoff = time.monotonic() - self.ttl
+        stale = [
+            key for key, entry in self._entries.items()
+            if entry["created_at"] < cutoff or entry["index_version"] != index_version
+        ]
+        for key in stale:
+            del self._entries[key]
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
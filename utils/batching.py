@@ -0,0 +1,67 @@
+# utils/batching.py
+
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from utils.logging_config import logger
+
+class MicroBatcher:
+    """Coalesces items from concurrent callers into batches of up to `max_batch_size`, waiting at most `max_wait` seconds."""
+    def __init__(self, batch_fn, max_batch_size: int, max_wait: float, name: str = "batcher"):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self.batches_run = 0
+        self.items_processed = 0
+        self._pending = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name=f"{name}-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, items: list) -> list:
+        """Blocks until every item has been processed and returns the results in order."""
+        futures = []
+        for start in range(0, len(items), self.max_batch_size):
+            future = Future()
+            self._pending.put((items[start:start + self.max_batch_size], future))
+            futures.append(future)
+        return [result for future in futures for result in future.result()]
+
+    def _run(self):
+        carry_over = None
+        while True:
+            requests = [carry_over or self._pending.get()]
+            carry_over = None
+            size = len(requests[0][0])
+            deadline = time.monotonic() + self.max_wait
+
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    request = self._pending.get(timeout=remaining) if remaining > 0 else self._pending.get_nowait()
+                except queue.Empty:
+                    break
+                if size + len(request[0]) > self.max_batch_size:
+                    carry_over = request
+                    break
+                requests.append(request)
+                size += len(request[0])
+
+            self._dispatch(requests)
+
+    def _dispatch(self, requests: list):
+        items = [item for request_items, _ in requests for item in request_items]
+        try:
+            results = self.batch_fn(items)
+        except Exception as e:
+            logger.error(f"Batch of {len(items)} items failed: {e}")
+            for _, future in requests:
+                future.set_exception(e)
+            return
+
+        self.batches_run += 1
+        self.items_processed += len(items)
+        offset = 0
+        for request_items, future in requests:
+            future.set_result(results[offset:offset + len(request_items)])
+            offset += len(request_items)
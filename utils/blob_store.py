@@ -0,0 +1,130 @@
+# utils/blob_store.py
+
+import os
+import json
+import time
+import uuid
+import hashlib
+import tempfile
+from utils.logging_config import logger
+from config import config
+
+class BlobStoreError(Exception): pass
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def _new_key(data: bytes) -> str:
+    # Unique per put: two in-flight messages with identical chunks must not share (and delete) one blob.
+    return f"{content_hash(data)}-{uuid.uuid4().hex}"
+
+class RedisBlobStore:
+    """Stores blobs as Redis keys, expiring after a TTL."""
+    def __init__(self, ttl: int = config.BLOB_TTL_SECONDS):
+        import redis
+        self.ttl = ttl
+        # Blobs are raw bytes, so this client does not decode responses.
+        self.redis_client = redis.Redis(host=config.REDIS_HOST, port=config.REDIS_PORT, db=0)
+
+    def put(self, data: bytes) -> str:
+        key = _new_key(data)
+        self.redis_client.set(f"blob:{key}", data, ex=self.ttl)
+        return key
+
+    def get(self, key: str) -> bytes:
+        data = self.redis_client.get(f"blob:{key}")
+        if data is None:
+            raise BlobStoreError(f"Blob {key} not found (it may have expired).")
+        return _verified(key, data)
+
+    def delete(self, key: str):
+        self.redis_client.delete(f"blob:{key}")
+
+class FileBlobStore:
+    """Stores blobs as files in a directory shared by all agents, removing those older than a TTL."""
+    def __init__(self, root: str = config.BLOB_STORE_DIR, ttl: int = config.BLOB_TTL_SECONDS):
+        self.root = root
+        self.ttl = ttl
+        self._last_sweep = 0.0
+        os.makedirs(self.root, exist_ok=True)
+
+    def put(self, data: bytes) -> str:
+        self._sweep()
+        key = _new_key(data)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(key))
+        return key
+
+    def get(self, key: str) -> bytes:
+        try:
+            with open(self._path(key), "rb") as f:
+                return _verified(key, f.read())
+        except FileNotFoundError:
+            raise BlobStoreError(f"Blob {key} not found in {self.root}.")
+
+    def delete(self, key: str):
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _sweep(self):
+        """Deletes blobs (and temporary files) left behind by consumers that crashed, at most once per interval."""
+        now = time.time()
+        if now - self._last_sweep < config.BLOB_SWEEP_INTERVAL_SECONDS:
+            return
+        self._last_sweep = now
+        for name in os.listdir(self.root):
+            path = self._path(name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl:
+                    os.unlink(path)
+            except FileNotFoundError:
+                pass  # Consumed or swept by another process meanwhile.
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+def _verified(key: str, data: bytes) -> bytes:
+    if content_hash(data) != key.split("-", 1)[0]:
+        raise BlobStoreError(f"Blob {key} is corrupt: content hash mismatch.")
+    return data
+
+def create_blob_store():
+    """Returns the blob store selected by BLOB_STORE_BACKEND."""
+    if config.BLOB_STORE_BACKEND == "file":
+        return FileBlobStore()
+    if config.BLOB_STORE_BACKEND == "redis":
+        return RedisBlobStore()
+    raise ValueError(f"Unknown BLOB_STORE_BACKEND: {config.BLOB_STORE_BACKEND}")
+
+# --- Chunk payloads ---
+
+def pack_chunks(blob_store, chunks: list[str], metadatas: list[dict]) -> dict:
+    """Builds the ADD_DOCUMENT chunk payload, moving large documents into blobs of BLOB_BATCH_CHUNKS chunks."""
+    if sum(len(chunk.encode("utf-8")) for chunk in chunks) <= config.BLOB_INLINE_MAX_BYTES:
+        return {"chunks": chunks, "metadatas": metadatas}
+
+    refs = []
+    for start in range(0, len(chunks), config.BLOB_BATCH_CHUNKS):
+        batch = {
+            "chunks": chunks[start:start + config.BLOB_BATCH_CHUNKS],
+            "metadatas": metadatas[start:start + config.BLOB_BATCH_CHUNKS],
+        }
+        key = blob_store.put(json.dumps(batch).encode("utf-8"))
+        refs.append({"key": key, "count": len(batch["chunks"])})
+    logger.debug(f"Stored {len(chunks)} chunks out of band in {len(refs)} blob(s).")
+    return {"chunk_refs": refs}
+
+def iter_chunk_batches(blob_store, payload: dict, delete: bool = True):
+    """Yields (chunks, metadatas) batches from an inline or by-reference ADD_DOCUMENT payload."""
+    if "chunk_refs" not in payload:
+        yield payload["chunks"], payload["metadatas"]
+        return
+    for ref in payload["chunk_refs"]:
+        batch = json.loads(blob_store.get(ref["key"]))
+        yield batch["chunks"], batch["metadatas"]
+        if delete:
+            blob_store.delete(ref["key"])
@@ -0,0 +1,50 @@
+# utils/context_packing.py
+
+from config import config
+
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+
+def _strip_overlap(text: str, packed: list[str]) -> str:
+    """Removes text that neighbouring chunks already contribute through CHUNK_OVERLAP."""
+    for other in packed:
+        # `other` ends with the start of `text` (text follows it in the document).
+        for size in range(min(len(other), len(text), config.CHUNK_OVERLAP), config.MIN_DEDUP_OVERLAP - 1, -1):
+            if other.endswith(text[:size]):
+                text = text[size:]
+                break
+        # `text` ends with the start of `other` (text precedes it in the document).
+        for size in range(min(len(other), len(text), config.CHUNK_OVERLAP), config.MIN_DEDUP_OVERLAP - 1, -1):
+            if other.startswith(text[-size:]):
+                text = text[:-size]
+                break
+    return text.strip()
+
+def _truncate_to_budget(text: str, count_tokens, budget: int) -> str:
+    """Longest prefix of `text` that fits in `budget` tokens (binary search over characters)."""
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(text[:middle]) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low]
+
+def pack_context(chunks: list[str], count_tokens, budget: int) -> str:
+    """Joins chunks in relevance order within `budget` tokens, dropping duplicates and repeated overlaps."""
+    packed, used = [], 0
+    separator_tokens = count_tokens(CONTEXT_SEPARATOR)
+    for chunk in chunks:
+        if any(chunk in other for other in packed):
+            continue
+        text = _strip_overlap(chunk, packed)
+        if not text:
+            continue
+        cost = count_tokens(text) + (separator_tokens if packed else 0)
+        if used + cost <= budget:
+            packed.append(text)
+            used += cost
+        elif not packed:
+            packed.append(_truncate_to_budget(text, count_tokens, budget))
+            used = budget
+    return CONTEXT_SEPARATOR.join(packed)
@@ -0,0 +1,54 @@
+# utils/document_registry.py
+
+import hashlib
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class DocumentRegistry:
+    """Maps each document_id to its live chunks' docstore ids by chunk hash; rebuilt from chunk metadata on load."""
+    def __init__(self):
+        self.documents: dict[str, dict[str, str]] = {}
+        self.tombstones: set[str] = set()
+        self._locations: dict[str, tuple[str, str]] = {}  # docstore id -> (document_id, chunk_hash)
+
+    @classmethod
+    def from_entries(cls, entries, tombstones=()) -> "DocumentRegistry":
+        registry = cls()
+        registry.add(entries)
+        registry.remove(tombstones)
+        return registry
+
+    def add(self, entries):
+        """Registers (docstore_id, Document) pairs; chunks indexed without a document_id are ignored."""
+        for doc_id, document in entries:
+            document_id = document.metadata.get("document_id")
+            if document_id is None:
+                continue
+            self.documents.setdefault(document_id, {})[document.metadata["chunk_hash"]] = doc_id
+            self._locations[doc_id] = (document_id, document.metadata["chunk_hash"])
+
+    def remove(self, doc_ids):
+        """Tombstones the given docstore ids."""
+        for doc_id in doc_ids:
+            self.tombstones.add(doc_id)
+            location = self._locations.pop(doc_id, None)
+            if location is None:
+                continue
+            document_id, digest = location
+            chunks = self.documents.get(document_id, {})
+            if chunks.get(digest) == doc_id:
+                del chunks[digest]
+            if not chunks:
+                self.documents.pop(document_id, None)
+
+    def chunk_hashes(self, document_id: str) -> set[str]:
+        return set(self.documents.get(document_id, {}))
+
+    def chunk_ids(self, document_id: str, exclude_hashes=()) -> list[str]:
+        """Docstore ids of the document's live chunks, except those whose hash is in `exclude_hashes`."""
+        exclude_hashes = set(exclude_hashes)
+        return [doc_id for digest, doc_id in self.documents.get(document_id, {}).items() if digest not in exclude_hashes]
+
+    def clear_tombstones(self):
+        self.tombstones.clear()
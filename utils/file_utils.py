@@ -13,17 +13,31 @@ def get_file_loader(file_path):
     }
     return loaders.get(ext)
 
-def load_and_split_document(file_path):
-    """Loads a document using the correct loader and splits it into chunks."""
+def iter_document_chunks(file_path):
+    """Lazily loads a document page by page and yields its chunks as soon as they are split."""
     loader_class = get_file_loader(file_path)
     if not loader_class:
-        return []
+        return
 
     loader = loader_class(file_path)
-    docs = loader.load()
-
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=config.CHUNK_SIZE,
         chunk_overlap=config.CHUNK_OVERLAP
     )
-    return text_splitter.split_documents(docs)
\ No newline at end of file
+    for page in loader.lazy_load():
+        yield from text_splitter.split_documents([page])
+
+def iter_document_batches(file_path, batch_size=config.INGEST_BATCH_CHUNKS):
+    """Groups the lazily produced chunks into batches so memory stays bounded by the batch size."""
+    batch = []
+    for chunk in iter_document_chunks(file_path):
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def load_and_split_document(file_path):
+    """Loads a document using the correct loader and splits it into chunks."""
+    return list(iter_document_chunks(file_path))
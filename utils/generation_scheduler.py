@@ -0,0 +1,127 @@
+# utils/generation_scheduler.py
+
+import time
+import heapq
+import itertools
+import threading
+from concurrent.futures import Future
+from utils.tracing import tracer
+from utils.logging_config import logger
+from config import config
+
+class SchedulerBusy(Exception): pass
+class DeadlineExpired(Exception): pass
+
+class _Job:
+    def __init__(self, run, priority: str, deadline: float | None):
+        self.run = run
+        self.priority = priority
+        self.rank = config.LLM_PRIORITIES.index(priority)
+        self.deadline = deadline
+        self.enqueued_at = time.time()
+        self.future = Future()
+
+class GenerationScheduler:
+    """Bounded priority and deadline queue for LLM generations that refuses work it can't start in time."""
+    def __init__(self, slots: int = config.LLM_PARALLEL_SLOTS, max_queue: int = config.LLM_QUEUE_MAX):
+        self.slots = slots
+        self.max_queue = max_queue
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._running = 0
+        self._service_time = config.LLM_SERVICE_TIME_ESTIMATE  # Moving average of seconds per job.
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._work, args=(slot,), name=f"generation-slot-{slot}", daemon=True)
+            for slot in range(slots)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, run, priority: str = "interactive", deadline: float | None = None) -> Future:
+        """Queues `run(slot)` and returns a Future for its result."""
+        job = _Job(run, priority, deadline)
+        key = (job.rank, deadline or float("inf"))
+        shed = None
+        with self._condition:
+            ahead = sum(1 for entry in self._heap if entry[:2] <= key)
+            expected_start = job.enqueued_at + self._service_time * ((ahead + self._running) // self.slots)
+            if self._closed:
+                shed = (job, SchedulerBusy("Generation scheduler is shutting down."))
+            elif deadline is not None and expected_start >= deadline:
+                shed = (job, SchedulerBusy(f"Expected to start after its deadline ({ahead} job(s) ahead)."))
+            elif len(self._heap) >= self.max_queue and max(self._heap)[:2] <= key:
+                shed = (job, SchedulerBusy("Generation queue is full."))
+            else:
+                if len(self._heap) >= self.max_queue:
+                    # The newcomer outranks the worst queued job, which makes room for it.
+                    worst = max(self._heap)
+                    self._heap.remove(worst)
+                    heapq.heapify(self._heap)
+                    shed = (worst[3], SchedulerBusy("Shed for a higher-priority request."))
+                heapq.heappush(self._heap, (*key, next(self._sequence), job))
+                tracer.set_gauge("llm_queue_depth", len(self._heap))
+                self._condition.notify()
+        # Failed futures run their callbacks, which may send messages; never under the lock.
+        if shed is not None:
+            shed_job, error = shed
+            tracer.increment("llm_jobs_total", outcome="shed", priority=shed_job.priority)
+            shed_job.future.set_exception(error)
+        return job.future
+
+    def shutdown(self, wait: bool = True):
+        """Stops admitting jobs and fails queued ones with SchedulerBusy; with `wait`, lets running ones finish."""
+        with self._condition:
+            self._closed = True
+            queued = [entry[3] for entry in sorted(self._heap)]
+            self._heap = []
+            tracer.set_gauge("llm_queue_depth", 0)
+            self._condition.notify_all()
+        for job in queued:
+            tracer.increment("llm_jobs_total", outcome="shed", priority=job.priority)
+            job.future.set_exception(SchedulerBusy("Generation scheduler is shutting down."))
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _work(self, slot: int):
+        while True:
+            with self._condition:
+                while not self._heap and not self._closed:
+                    self._condition.wait()
+                if not self._heap:
+                    return
+                job = heapq.heappop(self._heap)[3]
+                tracer.set_gauge("llm_queue_depth", len(self._heap))
+                self._running += 1
+            try:
+                self._run(job, slot)
+            finally:
+                with self._condition:
+                    self._running -= 1
+
+    def _run(self, job: _Job, slot: int):
+        started = time.time()
+        tracer.observe("llm_queue_wait_seconds", started - job.enqueued_at, priority=job.priority)
+        if job.deadline is not None and started >= job.deadline:
+            tracer.increment("llm_jobs_total", outcome="expired", priority=job.priority)
+            job.future.set_exception(DeadlineExpired(f"Deadline passed after {started - job.enqueued_at:.1f}s in queue."))
+            return
+        if not job.future.set_running_or_notify_cancel():
+            return
+        try:
+            job.future.set_result(job.run(slot))
+            tracer.increment("llm_jobs_total", outcome="completed", priority=job.priority)
+        except Exception as e:
+            logger.error(f"Generation job failed on slot {slot}: {e}", exc_info=True)
+            tracer.increment("llm_jobs_total", outcome="failed", priority=job.priority)
+            job.future.set_exception(e)
+        finally:
+            with self._condition:
+                self._service_time = 0.8 * self._service_time + 0.2 * (time.time() - started)
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {"queued": len(self._heap), "running": self._running, "slots": self.slots,
+                    "service_time": self._service_time}
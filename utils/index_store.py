@@ -0,0 +1,289 @@
+# utils/index_store.py
+
+import os
+import json
+import pickle
+import tempfile
+from contextlib import contextmanager
+import numpy as np
+import faiss
+try:
+    import fcntl
+except ImportError:  # Windows: single-writer deployments only
+    fcntl = None
+from langchain_community.vectorstores import FAISS
+from utils.lexical_index import BM25Index
+from utils.document_registry import DocumentRegistry
+from utils.ann_index import compact_index
+from utils.logging_config import logger
+from config import config
+
+class IndexStoreError(Exception): pass
+
+MANIFEST_READ_ATTEMPTS = 5
+
+class IndexStore:
+    """Versioned, append-only on-disk storage for the FAISS vector store: CURRENT -> manifest -> base + segments."""
+    def __init__(self, root: str = config.VECTOR_STORE_DIR):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+        self.manifest = {"version": 0, "base": None, "segments": []}
+        self.lexical_index = BM25Index()
+        self.registry = DocumentRegistry()
+        self._mmapped = False
+
+    @property
+    def version(self) -> int:
+        return self.manifest["version"]
+
+    def current_version(self) -> int:
+        """Returns the version published on disk, which may be ahead of the loaded one."""
+        manifest = self._read_current_manifest()
+        return manifest["version"] if manifest else 0
+
+    # --- Loading ---
+
+    def load(self, embedding) -> FAISS | None:
+        """Loads the published index; at most the vectors are memory-mapped, so this is still linear in the corpus."""
+        for _ in range(MANIFEST_READ_ATTEMPTS):
+            manifest = self._read_current_manifest()
+            if not manifest or not manifest["base"]:
+                return None
+            try:
+                return self._load_manifest(manifest, embedding)
+            except FileNotFoundError:
+                # A writer published and pruned this version while we were reading it.
+                logger.info(f"Vector store version {manifest['version']} was replaced while loading; retrying.")
+        raise IndexStoreError(f"The vector store in {self.root} kept changing while it was being loaded.")
+
+    def _load_manifest(self, manifest: dict, embedding) -> FAISS:
+        # Appending segments needs a writable index, so only a clean snapshot is mmapped.
+        index, mapped = self._read_index(manifest["base"], mmap=not manifest["segments"])
+        with open(self._path(f"{manifest['base']}.pkl"), "rb") as f:
+            docstore, index_to_docstore_id, *rest = pickle.load(f)
+        tombstones = rest[0] if rest else []  # Snapshots written before deletes were supported have none.
+
+        vector_store = FAISS(embedding, index, docstore, index_to_docstore_id)
+        self.registry = DocumentRegistry.from_entries(
+            ((doc_id, docstore.search(doc_id)) for doc_id in index_to_docstore_id.values()), tombstones
+        )
+        self.lexical_index = self._load_lexical_index(manifest["base"], vector_store)
+        for segment in manifest["segments"]:
+            self._apply_segment(vector_store, segment)
+
+        self.manifest = manifest
+        self._mmapped = mapped is not None
+        logger.info(f"Loaded vector store version {self.version} ({index.ntotal} vectors, "
+                    f"{len(manifest['segments'])} segment(s), memory-mapped: {mapped or 'nothing'}).")
+        return vector_store
+
+    def refresh(self, vector_store: FAISS | None, embedding) -> FAISS | None:
+        """Catches up with versions published by other processes, applying new segments in place when the base is unchanged."""
+        manifest = self._read_current_manifest()
+        if not manifest or manifest["version"] == self.version:
+            return vector_store
+
+        loaded_segments = self.manifest["segments"]
+        if (vector_store is not None
+                and manifest["base"] == self.manifest["base"]
+                and manifest["segments"][:len(loaded_segments)] == loaded_segments):
+            self.ensure_writable(vector_store)
+            try:
+                for segment in manifest["segments"][len(loaded_segments):]:
+                    self._apply_segment(vector_store, segment)
+            except FileNotFoundError:
+                # Pruned by a newer version; the store may be half caught up, so start over.
+                return self.load(embedding)
+            self.manifest = manifest
+            logger.info(f"Caught up to vector store version {self.version}.")
+            return vector_store
+        return self.load(embedding)
+
+    def _apply_segment(self, vector_store: FAISS, segment: str):
+        with open(self._path(f"{segment}.pkl"), "rb") as f:
+            record = pickle.load(f)
+        # Segments written before deletes were supported hold just the entry list.
+        entries, tombstones = (record, []) if isinstance(record, list) else (record["entries"], record["tombstones"])
+        if entries:
+            vector_store.index.add(np.load(self._path(f"{segment}.npy")))
+            for doc_id, document in entries:
+                vector_store.docstore.add({doc_id: document})
+                vector_store.index_to_docstore_id[len(vector_store.index_to_docstore_id)] = doc_id
+            self.lexical_index.add([doc_id for doc_id, _ in entries], [doc.page_content for _, doc in entries])
+            self.registry.add(entries)
+        if tombstones:
+            self._forget(vector_store, tombstones)
+
+    def _forget(self, vector_store: FAISS, doc_ids: list[str]):
+        self.lexical_index.remove(doc_ids, [vector_store.docstore.search(doc_id).page_content for doc_id in doc_ids])
+        self.registry.remove(doc_ids)
+
+    def _load_lexical_index(self, base: str, vector_store: FAISS) -> BM25Index:
+        try:
+            with open(self._path(f"{base}.bm25.pkl"), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            # Snapshots written before the lexical index existed: rebuild it once from the docstore.
+            lexical_index = BM25Index()
+            doc_ids = [i for i in vector_store.index_to_docstore_id.values() if i not in self.registry.tombstones]
+            lexical_index.add(doc_ids, [vector_store.docstore.search(i).page_content for i in doc_ids])
+            return lexical_index
+
+    def ensure_writable(self, vector_store: FAISS):
+        """Replaces a memory-mapped, read-only index with an in-memory copy before mutation."""
+        if self._mmapped:
+            vector_store.index, _ = self._read_index(self.manifest["base"], mmap=False)
+            self._mmapped = False
+
+    def _read_index(self, base: str, mmap: bool):
+        """Reads a snapshot's FAISS index; returns it and a description of what is memory-mapped, if anything."""
+        path = self._path(f"{base}.faiss")
+        try:
+            mapped, flags = self._mmap_flags(path) if mmap else (None, 0)
+            return (faiss.read_index(path, flags) if flags else faiss.read_index(path)), mapped
+        except Exception as e:
+            if not os.path.exists(path):
+                raise FileNotFoundError(path) from e
+            raise IndexStoreError(f"Failed to read FAISS index {path}: {e}")
+
+    @staticmethod
+    def _mmap_flags(path: str) -> tuple[str | None, int]:
+        """Picks the FAISS read flags that memory-map as much of the index at `path` as this FAISS build can."""
+        with open(path, "rb") as f:
+            fourcc = f.read(4)
+        # IO_FLAG_MMAP only maps the inverted lists of IVF indexes, whose fourcc starts "Iw" (or "Iv" in old files).
+        if fourcc[:2] in (b"Iw", b"Iv"):
+            return "IVF inverted lists", faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+        # Flat indexes and HNSW's vector storage need IO_FLAG_MMAP_IFC, which only recent FAISS releases define.
+        # The HNSW graph itself is always read into memory.
+        if hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+            return "flat vectors", faiss.IO_FLAG_MMAP_IFC
+        return None, 0
+
+    # --- Writing ---
+
+    @contextmanager
+    def write_lock(self):
+        """Serializes writers across processes sharing the store directory."""
+        with open(self._path("LOCK"), "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def append(self, vector_store: FAISS, vectors, entries: list, tombstones: list[str] = ()):
+        """Persists the vectors and entries just added to the store, and the docstore ids just deleted from it."""
+        if not self.manifest["base"] or len(self.manifest["segments"]) >= config.VECTOR_STORE_MAX_SEGMENTS:
+            self.snapshot(vector_store)
+            return
+
+        version = self.version + 1
+        segment = f"seg-{version:08d}"
+        if entries:
+            self._atomic_write(f"{segment}.npy", lambda f: np.save(f, np.asarray(vectors, dtype="float32")))
+        self._atomic_write(f"{segment}.pkl", lambda f: pickle.dump({"entries": entries, "tombstones": list(tombstones)}, f))
+        self._publish({
+            "version": version,
+            "base": self.manifest["base"],
+            "segments": self.manifest["segments"] + [segment],
+        })
+
+    def snapshot(self, vector_store: FAISS):
+        """Writes the whole index as a new base snapshot, folding in all segments."""
+        version = self.version + 1
+        base = f"base-{version:08d}"
+        self._atomic_write(f"{base}.faiss", lambda f: faiss.write_index(
+            vector_store.index, faiss.PyCallbackIOWriter(f.write)))
+        self._atomic_write(f"{base}.pkl", lambda f: pickle.dump(
+            (vector_store.docstore, vector_store.index_to_docstore_id, sorted(self.registry.tombstones)), f))
+        self._atomic_write(f"{base}.bm25.pkl", lambda f: pickle.dump(self.lexical_index, f))
+        self._publish({"version": version, "base": base, "segments": []})
+
+    def delete(self, vector_store: FAISS, doc_ids: list[str]):
+        """Tombstones chunks: they leave the lexical index now and the FAISS index at the next compaction."""
+        doc_ids = [doc_id for doc_id in doc_ids if doc_id not in self.registry.tombstones]
+        if not doc_ids:
+            return
+        self._forget(vector_store, doc_ids)
+        self.append(vector_store, [], [], tombstones=doc_ids)
+
+    def compact(self, vector_store: FAISS):
+        """Rebuilds the index and docstore without tombstoned chunks and publishes them as a new snapshot."""
+        self.ensure_writable(vector_store)
+        tombstones = self.registry.tombstones
+        positions = sorted(vector_store.index_to_docstore_id)
+        keep = [p for p in positions if vector_store.index_to_docstore_id[p] not in tombstones]
+        vector_store.index = compact_index(vector_store.index, keep)
+        vector_store.index_to_docstore_id = {
+            new: vector_store.index_to_docstore_id[old] for new, old in enumerate(keep)
+        }
+        vector_store.docstore.delete(list(tombstones))
+        self._mmapped = False
+        removed = len(tombstones)
+        self.registry.clear_tombstones()
+        self.snapshot(vector_store)
+        logger.info(f"Compacted the vector store: removed {removed} deleted chunk(s), {len(keep)} remain.")
+
+    def _publish(self, manifest: dict):
+        manifest_name = f"manifest-{manifest['version']:08d}.json"
+        self._atomic_write(manifest_name, lambda f: f.write(json.dumps(manifest).encode("utf-8")))
+        self._atomic_write("CURRENT", lambda f: f.write(manifest_name.encode("utf-8")))
+        self.manifest = manifest
+        logger.debug(f"Published vector store version {manifest['version']}.")
+        self._prune()
+
+    def _prune(self):
+        """Removes files no longer referenced by the most recent manifests."""
+        manifests = sorted(n for n in os.listdir(self.root) if n.startswith("manifest-"))
+        keep = manifests[-config.VECTOR_STORE_KEEP_VERSIONS:]
+        referenced = set(keep)
+        for name in keep:
+            with open(self._path(name)) as f:
+                manifest = json.load(f)
+            for stem in [manifest["base"], *manifest["segments"]]:
+                if stem:
+                    referenced.update({f"{stem}.faiss", f"{stem}.npy", f"{stem}.pkl", f"{stem}.bm25.pkl"})
+
+        for name in os.listdir(self.root):
+            if name.startswith(("manifest-", "base-", "seg-")) and name not in referenced:
+                try:
+                    os.unlink(self._path(name))
+                except OSError as e:
+                    logger.warning(f"Could not remove stale index file {name}: {e}")
+
+    def _atomic_write(self, name: str, write_fn):
+        """Runs ``write_fn`` against a temporary file, then renames it into place."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write_fn(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._path(name))
+        except Exception as e:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise IndexStoreError(f"Failed to write {name}: {e}")
+
+    # --- Helpers ---
+
+    def _read_current_manifest(self) -> dict | None:
+        """The published manifest, or None if nothing has been published yet."""
+        for _ in range(MANIFEST_READ_ATTEMPTS):
+            try:
+                with open(self._path("CURRENT")) as f:
+                    manifest_name = f.read().strip()
+            except FileNotFoundError:
+                return None
+            try:
+                with open(self._path(manifest_name)) as f:
+                    return json.load(f)
+            except FileNotFoundError:
+                continue  # Pruned right after CURRENT moved on; read CURRENT again.
+        raise IndexStoreError(f"Could not read the manifest CURRENT points to in {self.root}.")
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, name)
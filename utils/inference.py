@@ -1,33 +1,151 @@
 # utils/inference.py
 
-import torch
-from sentence_transformers import SentenceTransformer, CrossEncoder
-from huggingface_hub import hf_hub_download
-# --- THIS IS THE FINAL, CORRECT IMPORT ---
-from ctransformers import AutoModelForCausalLM as CTransformersModel
+import time
+import codecs
+import threading
+from langchain_core.embeddings import Embeddings
+from utils.batching import MicroBatcher
+from utils.embedding_cache import EmbeddingCache
+from utils.reranker import RerankStage
+from utils.tracing import tracer, RATE_BUCKETS
 from utils.logging_config import logger
 from config import config
 
 class ModelLoaderError(Exception): pass
 class InferenceError(Exception): pass
 
+MODEL_COMPONENTS = ("embedding", "reranker", "llm")
+
 class LocalInference:
-    def __init__(self):
+    """Local models, each loaded on first use or ahead of time by `warm_up`."""
+    def __init__(self, components=MODEL_COMPONENTS):
         logger.info("Initializing local inference services...")
-        self.embedding_model = self._load_embedding_or_reranker_model(SentenceTransformer, config.EMBEDDING_MODEL_NAME)
-        self.reranker_model = self._load_embedding_or_reranker_model(CrossEncoder, config.RERANKER_MODEL_NAME)
-        self.text_generator = self._load_gguf_llm()
-        logger.info(f"All models loaded successfully to device: {config.DEVICE}")
+        self.components = tuple(components)  # The models this process may load
+        self._models = {}
+        self._load_locks = {component: threading.Lock() for component in MODEL_COMPONENTS}
+        self._loaders = {
+            "embedding": self._load_embedding_model,
+            "reranker": self._load_reranker_model,
+            "llm": self._load_gguf_llm,
+        }
+        self.readiness = {component: "not_loaded" for component in MODEL_COMPONENTS}
+        self.load_times = {}
+        # Independent LLM instances for parallel generation, see `generation_slot`.
+        self._slots = {}
+        self._slot_locks = {}
+
+        # One embedding engine serves every caller; concurrent requests are encoded together.
+        self.embedding_batcher = MicroBatcher(
+            self._encode_batch,
+            max_batch_size=config.EMBEDDING_MAX_BATCH_SIZE,
+            max_wait=config.EMBEDDING_MAX_WAIT_MS / 1000,
+            name="embedding",
+        )
+        self.embedding_cache = EmbeddingCache()
+        # int8 vectors differ slightly from the PyTorch ones, so each backend gets its own cache entries.
+        self.embedding_cache_key = config.EMBEDDING_MODEL_NAME + ("@onnx-int8" if config.MODEL_BACKEND == "onnx" else "")
+        self.rerank_stage = RerankStage(self._predict_pairs)
+        self.embeddings = LocalEmbeddings(self)
+
+    @property
+    def embedding_model(self):
+        return self._get_model("embedding")
+
+    @property
+    def reranker_model(self):
+        return self._get_model("reranker")
+
+    @property
+    def text_generator(self):
+        return self._get_model("llm")
+
+    def _get_model(self, component: str):
+        model = self._models.get(component)
+        if model is None:
+            if component not in self.components:
+                raise ModelLoaderError(f"The {component} model is not enabled in this process.")
+            with self._load_locks[component]:
+                if component not in self._models:
+                    self._load(component)
+            model = self._models[component]
+        return model
+
+    def _load(self, component: str):
+        self.readiness[component] = "loading"
+        start = time.perf_counter()
+        try:
+            self._models[component] = self._loaders[component]()
+        except Exception:
+            self.readiness[component] = "failed"
+            raise
+        self.load_times[component] = time.perf_counter() - start
+        self.readiness[component] = "ready"
+        logger.info(f"Model '{component}' ready in {self.load_times[component]:.1f}s.")
+
+    def warm_up(self, components=None, background: bool = True):
+        """Loads `components` (all enabled ones by default) ahead of their first use, by default on a daemon thread."""
+        components = self.components if components is None else components
+
+        def load_all():
+            for component in components:
+                try:
+                    self._get_model(component)
+                except ModelLoaderError as e:
+                    logger.error(f"Warm-up of '{component}' failed: {e}")
+            logger.info(self.startup_report())
+
+        if not background:
+            load_all()
+            return None
+        thread = threading.Thread(target=load_all, name="model-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def is_ready(self, components=MODEL_COMPONENTS) -> bool:
+        return all(self.readiness[component] == "ready" for component in components)
+
+    def startup_report(self) -> str:
+        """One line per model with its state and load time."""
+        lines = ["Model startup report:"]
+        for component in MODEL_COMPONENTS:
+            seconds = self.load_times.get(component)
+            timing = f" in {seconds:.1f}s" if seconds is not None else ""
+            lines.append(f"  {component:<10} {self.readiness[component]}{timing}")
+        lines.append(f"  total      {sum(self.load_times.values()):.1f}s")
+        return "\n".join(lines)
+
+    def _load_embedding_model(self):
+        if config.MODEL_BACKEND == "onnx":
+            from utils.onnx_models import OnnxEmbedder
+            return self._load_onnx_model(OnnxEmbedder, config.EMBEDDING_MODEL_NAME)
+        from sentence_transformers import SentenceTransformer
+        return self._load_embedding_or_reranker_model(SentenceTransformer, config.EMBEDDING_MODEL_NAME)
+
+    def _load_reranker_model(self):
+        if config.MODEL_BACKEND == "onnx":
+            from utils.onnx_models import OnnxCrossEncoder
+            return self._load_onnx_model(OnnxCrossEncoder, config.RERANKER_MODEL_NAME)
+        from sentence_transformers import CrossEncoder
+        return self._load_embedding_or_reranker_model(CrossEncoder, config.RERANKER_MODEL_NAME)
+
+    def _load_onnx_model(self, model_class, model_name):
+        try:
+            logger.info(f"Loading model: {model_name} with ONNX Runtime (int8)")
+            return model_class(model_name)
+        except Exception as e:
+            raise ModelLoaderError(f"Failed to load {model_name} for ONNX Runtime: {e}")
 
     def _load_embedding_or_reranker_model(self, model_class, model_name):
         try:
-            logger.info(f"Loading model: {model_name}")
+            logger.info(f"Loading model: {model_name} on device: {config.DEVICE}")
             return model_class(model_name, cache_folder=config.MODEL_CACHE_DIR, device=config.DEVICE)
         except Exception as e:
             raise ModelLoaderError(f"Failed to load {model_name}: {e}")
     
     def _load_gguf_llm(self):
         try:
+            from huggingface_hub import hf_hub_download
+            from ctransformers import AutoModelForCausalLM as CTransformersModel
             logger.info(f"Downloading and loading GGUF LLM: {config.LLM_MODEL_NAME}, file: {config.LLM_MODEL_FILE}")
             model_path = hf_hub_download(
                 repo_id=config.LLM_MODEL_NAME,
@@ -39,36 +157,158 @@ class LocalInference:
                 model_path,
                 model_type="mistral",
                 gpu_layers=0, # Ensures CPU usage for consistent performance
-                context_length=4096,
+                threads=config.llm_threads_per_slot(), # Parallel slots split the cores instead of oversubscribing them
+                context_length=config.LLM_CONTEXT_LENGTH,
+                mmap=config.LLM_MMAP, # Pages the weights in on demand rather than copying 4 GB up front
             )
             logger.info("GGUF LLM loaded successfully for CPU execution.")
             return llm
         except Exception as e:
             raise ModelLoaderError(f"Failed to load GGUF LLM: {e}")
 
+    def _encode_batch(self, texts):
+        # Runs on the batcher thread for several requests at once, so the span carries no trace_id.
+        with tracer.span("embedding.encode", batch_size=len(texts)):
+            return self.embedding_model.encode(texts, batch_size=len(texts), convert_to_tensor=False).tolist()
+
     def get_embeddings(self, texts):
         try:
-            return self.embedding_model.encode(texts, convert_to_tensor=False).tolist()
+            return self.embedding_batcher.submit(list(texts))
         except Exception as e:
             raise InferenceError(f"Embedding encoding failed: {e}")
 
-    def rerank_documents(self, query: str, documents: list[str]) -> list[str]:
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embeds document chunks, taking previously seen chunks from the embedding cache."""
+        vectors = self.embedding_cache.get_many(self.embedding_cache_key, texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            computed = dict(zip(missing, self.get_embeddings(missing)))
+            self.embedding_cache.put_many(self.embedding_cache_key, missing, list(computed.values()))
+            vectors = [vector if vector is not None else computed[text] for text, vector in zip(texts, vectors)]
+        return vectors
+
+    def _predict_pairs(self, pairs):
+        with tracer.span("reranker.predict", pairs=len(pairs)):
+            return self.reranker_model.predict(pairs, batch_size=len(pairs)).tolist()
+
+    def rerank_documents(self, query: str, documents: list[str], top_n: int | None = None,
+                         dense_scores: list[float] | None = None) -> list[str]:
         if not documents: return []
         try:
-            pairs = [[query, doc] for doc in documents]
-            scores = self.reranker_model.predict(pairs)
-            return [doc for _, doc in sorted(zip(scores, documents), reverse=True)]
+            return self.rerank_stage.rank(query, documents, top_n=top_n, dense_scores=dense_scores)
         except Exception as e:
             logger.error(f"Reranking failed: {e}. Returning original order.")
-            return documents
+            return documents[:top_n]
+
+    def count_tokens(self, text: str) -> int:
+        # Every generation slot loads the same LLM_MODEL_FILE, so slot 0's tokenizer counts for all of them.
+        return len(self.text_generator.tokenize(text))
+
+    def generation_slot(self, index: int = 0) -> "GenerationSlot":
+        """The index-th independent LLM instance; slot 0 wraps `text_generator`, others load on first use."""
+        lock = self._slot_locks.setdefault(index, threading.Lock())
+        with lock:
+            if index not in self._slots:
+                llm = self.text_generator if index == 0 else self._loaders["llm"]()
+                self._slots[index] = GenerationSlot(llm)
+        return self._slots[index]
 
-    def generate_text(self, prompt, max_new_tokens=512):
+    def generate_text(self, prompt, max_new_tokens=config.LLM_MAX_NEW_TOKENS, prefix=None, slot=0):
         try:
-            # We call the model directly. No more .invoke()
-            return self.text_generator(
-                prompt,
-                max_new_tokens=max_new_tokens,
-                temperature=0.7
-            )
+            generation_slot = self.generation_slot(slot)
+            with generation_slot.lock:
+                return "".join(generation_slot.generate(prompt, max_new_tokens, prefix))
+        except Exception as e:
+            raise InferenceError(f"Text generation failed: {e}")
+
+    def stream_text(self, prompt, max_new_tokens=config.LLM_MAX_NEW_TOKENS, prefix=None, slot=0):
+        """Yields generated text piece by piece as tokens are sampled."""
+        try:
+            generation_slot = self.generation_slot(slot)
+            with generation_slot.lock:
+                yield from generation_slot.generate(prompt, max_new_tokens, prefix)
+        except Exception as e:
+            raise InferenceError(f"Text generation failed: {e}")
+
+    def prime_prefix(self, prefix: str, slot=0):
+        """Evaluates a shared prompt prefix ahead of time so the next request only evaluates its suffix."""
+        try:
+            generation_slot = self.generation_slot(slot)
+            with generation_slot.lock:
+                if generation_slot.evaluated_prefix != prefix:
+                    generation_slot.evaluate_prefix(prefix)
         except Exception as e:
-            raise InferenceError(f"Text generation failed: {e}")
\ No newline at end of file
+            logger.warning(f"Could not pre-evaluate the prompt prefix: {e}")
+
+class GenerationSlot:
+    """One GGUF model instance and its evaluation state. Hold `lock` while using it."""
+    def __init__(self, llm):
+        self.llm = llm
+        # The model keeps its evaluation state internally and is not safe to share between threads.
+        self.lock = threading.Lock()
+        self.evaluated_prefix = None
+
+    def evaluate_prefix(self, prefix: str):
+        self.evaluated_prefix = None
+        with tracer.span("llm.prefix_eval") as span:
+            self.llm.reset()
+            tokens = self.llm.tokenize(prefix)
+            self.llm.eval(tokens)
+            span["prompt_tokens"] = len(tokens)
+        tracer.increment("llm_prompt_tokens_total", len(tokens))
+        self.evaluated_prefix = prefix
+
+    def generate(self, prompt, max_new_tokens, prefix=None):
+        """Samples tokens for `prompt`, continuing from the evaluated `prefix` when it matches."""
+        llm = self.llm
+        if prefix and prompt.startswith(prefix):
+            if self.evaluated_prefix != prefix:
+                self.evaluate_prefix(prefix)
+            tokens, reset = llm.tokenize(prompt[len(prefix):], add_bos_token=False), False
+        else:
+            tokens, reset = llm.tokenize(prompt), True
+        # ctransformers can't rewind its context, so the prefix is spent; callers re-prime it with `prime_prefix`.
+        self.evaluated_prefix = None
+
+        tracer.increment("llm_prompt_tokens_total", len(tokens))
+
+        # Tokens can end mid UTF-8 sequence, so bytes are decoded incrementally.
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        # ctransformers evaluates the prompt lazily, so it is timed up to the first sampled token.
+        # Spans are recorded explicitly because this generator yields to the caller in between.
+        start, clock, first_token_at, count = time.time(), time.perf_counter(), None, 0
+        try:
+            for count, token in enumerate(llm.generate(tokens, temperature=0.7, reset=reset), start=1):
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    tracer.record_span("llm.prompt_eval", start, first_token_at - clock,
+                                       prompt_tokens=len(tokens), prefix_reused=not reset)
+                text = decoder.decode(llm.detokenize([token], decode=False))
+                if text:
+                    yield text
+                if count >= max_new_tokens:
+                    break
+        finally:
+            self._record_decode(start, clock, first_token_at, count)
+
+    def _record_decode(self, start, clock, first_token_at, count):
+        if first_token_at is None:
+            return
+        seconds = time.perf_counter() - first_token_at
+        rate = (count - 1) / seconds if count > 1 and seconds > 0 else 0.0
+        tracer.record_span("llm.decode", start + (first_token_at - clock), seconds,
+                           generated_tokens=count, tokens_per_second=round(rate, 2))
+        tracer.increment("llm_generated_tokens_total", count)
+        if rate:
+            tracer.observe("llm_tokens_per_second", rate, buckets=RATE_BUCKETS)
+
+class LocalEmbeddings(Embeddings):
+    """Exposes the shared LocalInference embedding engine through LangChain's Embeddings interface."""
+    def __init__(self, inference: LocalInference):
+        self.inference = inference
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.inference.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.inference.get_embeddings([text])[0]
@@ -0,0 +1,36 @@
+# utils/ingest_tracker.py
+
+import json
+from config import config
+
+class IngestTracker:
+    """Counts indexed batches per (trace, document) in Redis, so any replica can tell when a document is complete."""
+    def __init__(self, redis_client, ttl: int = config.BLOB_TTL_SECONDS):
+        self.redis_client = redis_client
+        self.ttl = ttl
+
+    def record(self, trace_id: str, document_id: str, chunks: int, reused: int,
+               batch_count: int | None = None, keep_hashes: list[str] | None = None) -> dict | None:
+        """Records one indexed batch; returns the document's totals only to the caller whose batch completed it."""
+        key = f"ingest:{trace_id}:{document_id}"
+        pipe = self.redis_client.pipeline(transaction=True)
+        if batch_count is not None:
+            pipe.hset(key, mapping={"batch_count": batch_count, "keep_hashes": json.dumps(keep_hashes)})
+        pipe.hincrby(key, "done", 1)
+        pipe.hincrby(key, "chunks", chunks)
+        pipe.hincrby(key, "reused", reused)
+        pipe.hgetall(key)
+        pipe.expire(key, self.ttl)
+        state = {_text(field): _text(value) for field, value in pipe.execute()[-2].items()}
+        if "batch_count" not in state or int(state["done"]) != int(state["batch_count"]):
+            return None
+        self.redis_client.delete(key)
+        return {
+            "batches": int(state["batch_count"]),
+            "chunks": int(state["chunks"]),
+            "reused": int(state["reused"]),
+            "keep_hashes": json.loads(state["keep_hashes"]),
+        }
+
+def _text(value) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
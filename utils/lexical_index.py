@@ -0,0 +1,82 @@
+# utils/lexical_index.py
+
+import re
+import math
+import heapq
+from collections import Counter
+from config import config
+
+# Keeps identifiers such as "ERR-404", "v2.1" or "part_no/7781" together as one token.
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[._\-/][a-z0-9]+)*")
+_PART_PATTERN = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased word tokens; compound identifiers also contribute their parts."""
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        parts = _PART_PATTERN.findall(token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+class BM25Index:
+    """Incrementally maintained inverted index with Okapi BM25 scoring."""
+    def __init__(self, k1: float = config.BM25_K1, b: float = config.BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.postings: dict[str, dict[str, int]] = {}
+        self.doc_lengths: dict[str, int] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, doc_ids: list[str], texts: list[str]):
+        for doc_id, text in zip(doc_ids, texts):
+            if doc_id in self.doc_lengths:
+                continue
+            terms = tokenize(text)
+            for term, frequency in Counter(terms).items():
+                self.postings.setdefault(term, {})[doc_id] = frequency
+            self.doc_lengths[doc_id] = len(terms)
+            self.total_length += len(terms)
+
+    def remove(self, doc_ids: list[str], texts: list[str]):
+        """Drops documents; their texts are needed to find the postings to clean up."""
+        for doc_id, text in zip(doc_ids, texts):
+            if doc_id not in self.doc_lengths:
+                continue
+            for term in set(tokenize(text)):
+                postings = self.postings.get(term)
+                if postings is None:
+                    continue
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+            self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def search(self, query: str, k: int) -> list[tuple[str, float]]:
+        """Returns up to k (doc_id, score) pairs, best first."""
+        if not self.doc_lengths:
+            return []
+        num_docs = len(self.doc_lengths)
+        average_length = self.total_length / num_docs
+        scores: dict[str, float] = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (num_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, frequency in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / average_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = config.RRF_K) -> list[str]:
+    """Merges several best-first rankings of ids by summing 1 / (k + rank)."""
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
@@ -0,0 +1,41 @@
+# utils/message_codec.py
+
+import json
+import zlib
+from config import config
+
+class MessageCodec:
+    """Frames bus messages as a tag byte (b"j" JSON, b"m" msgpack; upper-case if zlib-compressed) and a body."""
+    def __init__(self, name: str = config.BUS_CODEC, compress_threshold: int = config.BUS_COMPRESS_THRESHOLD):
+        if name not in ("json", "msgpack"):
+            raise ValueError(f"Unknown bus codec: {name}")
+        if name == "msgpack":
+            import msgpack  # noqa: F401 -- fail at startup rather than on the first send
+        self.name = name
+        self.compress_threshold = compress_threshold
+        self._tag = b"m" if name == "msgpack" else b"j"
+
+    def encode(self, message: dict) -> bytes:
+        if self.name == "msgpack":
+            import msgpack
+            body = msgpack.packb(message, use_bin_type=True)
+        else:
+            body = json.dumps(message, separators=(",", ":")).encode("utf-8")
+        if self.compress_threshold and len(body) > self.compress_threshold:
+            return self._tag.upper() + zlib.compress(body, 1)
+        return self._tag + body
+
+    def decode(self, data: bytes | str) -> dict:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        tag, body = data[:1], data[1:]
+        if tag == b"{":  # Unframed JSON from older senders
+            return json.loads(data)
+        if tag.isupper():
+            tag, body = tag.lower(), zlib.decompress(body)
+        if tag == b"m":
+            import msgpack
+            return msgpack.unpackb(body, raw=False, strict_map_key=False)
+        if tag == b"j":
+            return json.loads(body)
+        raise ValueError(f"Unknown message frame {tag!r}")
@@ -0,0 +1,151 @@
+# utils/onnx_models.py
+
+"""ONNX Runtime int8 versions of the embedding and reranker models, exported from sentence-transformers on first use."""
+
+import os
+import json
+from abc import ABC, abstractmethod
+import shutil
+import tempfile
+import numpy as np
+from utils.logging_config import logger
+from config import config
+
+MODEL_FILE = "model.int8.onnx"
+SETTINGS_FILE = "settings.json"
+
+def export_dir(model_name: str) -> str:
+    return os.path.join(config.MODEL_CACHE_DIR, "onnx", model_name.replace("/", "--"))
+
+def _session(path: str):
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = config.ONNX_INTRA_OP_THREADS  # 0 lets ONNX Runtime use every physical core
+    options.inter_op_num_threads = 1
+    return ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+def _export(model, tokenizer, directory: str, settings: dict, output_axes: dict):
+    """Writes the int8 ONNX graph of a transformers model, its tokenizer and `settings` to `directory`."""
+    import torch
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    os.makedirs(directory, exist_ok=True)
+    probe = tokenizer(["a probe sentence"], return_tensors="pt")
+    input_names = list(probe.keys())
+
+    class FirstOutput(torch.nn.Module):
+        # HF models return ModelOutput objects; the exporter wants a plain tensor.
+        def __init__(self, wrapped):
+            super().__init__()
+            self.wrapped = wrapped
+
+        def forward(self, *inputs):
+            return self.wrapped(**dict(zip(input_names, inputs)))[0]
+
+    staging = tempfile.mkdtemp(dir=directory, prefix=".tmp-")
+    try:
+        fp32_path = os.path.join(staging, "model.onnx")
+        model.eval()
+        with torch.no_grad():
+            torch.onnx.export(
+                FirstOutput(model), tuple(probe[name] for name in input_names), fp32_path,
+                input_names=input_names,
+                output_names=["output"],
+                dynamic_axes={**{name: {0: "batch", 1: "sequence"} for name in input_names}, "output": output_axes},
+                opset_version=14,
+            )
+        quantize_dynamic(fp32_path, os.path.join(staging, MODEL_FILE), weight_type=QuantType.QInt8)
+        os.remove(fp32_path)
+        tokenizer.save_pretrained(staging)
+        with open(os.path.join(staging, SETTINGS_FILE), "w", encoding="utf-8") as f:
+            json.dump(settings, f)
+        # Model file last: `_OnnxModel` treats its existence as a finished export.
+        for name in sorted(os.listdir(staging), key=lambda name: name == MODEL_FILE):
+            os.replace(os.path.join(staging, name), os.path.join(directory, name))
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+class _OnnxModel(ABC):
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        directory = export_dir(model_name)
+        if not os.path.exists(os.path.join(directory, MODEL_FILE)):
+            logger.info(f"Exporting {model_name} to int8 ONNX in {directory}")
+            self._export(directory)
+        with open(os.path.join(directory, SETTINGS_FILE), encoding="utf-8") as f:
+            self.settings = json.load(f)
+
+        from tokenizers import Tokenizer
+        self.tokenizer = Tokenizer.from_file(os.path.join(directory, "tokenizer.json"))
+        self.tokenizer.enable_truncation(self.settings["max_length"])
+        self.tokenizer.enable_padding()  # To the longest sequence of each batch
+        self.session = _session(os.path.join(directory, MODEL_FILE))
+        self.input_names = [node.name for node in self.session.get_inputs()]
+
+    @abstractmethod
+    def _export(self, directory: str):
+        """Exports the model, its tokenizer and settings to `directory` with the module-level `_export`."""
+
+    def _run(self, inputs) -> tuple[np.ndarray, np.ndarray]:
+        """Runs one batch; returns the model output and the attention mask."""
+        encodings = self.tokenizer.encode_batch(inputs)
+        arrays = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        output = self.session.run(None, {name: arrays[name] for name in self.input_names})[0]
+        return output, arrays["attention_mask"]
+
+class OnnxEmbedder(_OnnxModel):
+    def _export(self, directory: str):
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(self.model_name, cache_folder=config.MODEL_CACHE_DIR, device="cpu")
+        transformer, pooling = model[0], model[1]
+        if not (pooling.pooling_mode_mean_tokens or pooling.pooling_mode_cls_token):
+            raise ValueError(f"{self.model_name} uses a pooling mode the ONNX backend doesn't support.")
+        settings = {
+            "max_length": model.max_seq_length,
+            "pooling": "mean" if pooling.pooling_mode_mean_tokens else "cls",
+            "normalize": any(type(module).__name__ == "Normalize" for module in model),
+        }
+        _export(transformer.auto_model, transformer.tokenizer, directory, settings, {0: "batch", 1: "sequence"})
+
+    def encode(self, texts, batch_size: int = 32, convert_to_tensor: bool = False) -> np.ndarray:
+        vectors = []
+        for start in range(0, len(texts), batch_size):
+            hidden, mask = self._run(list(texts[start:start + batch_size]))
+            if self.settings["pooling"] == "cls":
+                pooled = hidden[:, 0]
+            else:
+                mask = mask[..., None].astype(hidden.dtype)
+                pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if self.settings["normalize"]:
+                pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            vectors.append(pooled)
+        return np.vstack(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+
+class OnnxCrossEncoder(_OnnxModel):
+    def _export(self, directory: str):
+        import torch
+        from sentence_transformers import CrossEncoder
+        model = CrossEncoder(self.model_name, cache_folder=config.MODEL_CACHE_DIR, device="cpu")
+        activation = getattr(model, "default_activation_function", None)
+        settings = {
+            "max_length": model.max_length or model.tokenizer.model_max_length,
+            "activation": "sigmoid" if isinstance(activation, torch.nn.Sigmoid) else "identity",
+        }
+        _export(model.model, model.tokenizer, directory, settings, {0: "batch"})
+
+    def predict(self, pairs, batch_size: int = 32) -> np.ndarray:
+        scores = []
+        for start in range(0, len(pairs), batch_size):
+            logits, _ = self._run([tuple(pair) for pair in pairs[start:start + batch_size]])
+            if self.settings["activation"] == "sigmoid":
+                logits = 1 / (1 + np.exp(-logits))
+            scores.append(logits)
+        if not scores:
+            return np.empty(0, dtype=np.float32)
+        scores = np.vstack(scores)
+        return scores[:, 0] if scores.shape[1] == 1 else scores
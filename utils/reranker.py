@@ -0,0 +1,101 @@
+# utils/reranker.py
+
+import time
+import heapq
+import hashlib
+import threading
+from collections import OrderedDict
+from utils.batching import MicroBatcher
+from config import config
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+class RerankStage:
+    """Cross-encoder reranking with a shared score cache, an early exit on clear dense-score margins, and micro-batching."""
+    def __init__(self, predict_fn):
+        self.predict_fn = predict_fn
+        self._scores = OrderedDict()
+        self._lock = threading.Lock()
+        self._batcher = MicroBatcher(
+            self._predict_batch,
+            max_batch_size=config.RERANK_MAX_BATCH_PAIRS,
+            max_wait=config.RERANK_MAX_WAIT_MS / 1000,
+            name="reranker",
+        )
+        self._stats = {
+            "queries": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "early_exits": 0,
+            "early_exit_pairs_skipped": 0,
+            "predict_calls": 0,
+            "pairs_scored": 0,
+            "predict_seconds": 0.0,
+            "scoring_requests": 0,
+        }
+
+    def rank(self, query: str, documents: list[str], top_n: int | None = None, dense_scores: list[float] | None = None) -> list[str]:
+        """Returns up to `top_n` documents, most relevant first."""
+        top_n = min(top_n or len(documents), len(documents))
+        with self._lock:
+            self._stats["queries"] += 1
+
+        # 1. Early exit: a clear dense-score gap after position top_n makes reranking moot.
+        if dense_scores is not None and len(documents) > top_n:
+            ordered = sorted(range(len(documents)), key=lambda i: dense_scores[i], reverse=True)
+            margin = dense_scores[ordered[top_n - 1]] - dense_scores[ordered[top_n]]
+            if margin >= config.RERANK_EARLY_EXIT_MARGIN:
+                with self._lock:
+                    self._stats["early_exits"] += 1
+                    self._stats["early_exit_pairs_skipped"] += len(documents)
+                return [documents[i] for i in ordered[:top_n]]
+
+        # 2. Score cache lookups.
+        query_digest = _digest(query)
+        keys = [(query_digest, _digest(doc)) for doc in documents]
+        with self._lock:
+            scores = [self._scores.get(key) for key in keys]
+            for key, score in zip(keys, scores):
+                if score is not None:
+                    self._scores.move_to_end(key)
+            hits = sum(score is not None for score in scores)
+            self._stats["cache_hits"] += hits
+            self._stats["cache_misses"] += len(keys) - hits
+
+        # 3. Batched scoring of the remaining pairs.
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            with self._lock:
+                self._stats["scoring_requests"] += 1
+            fresh = self._batcher.submit([(query, documents[i]) for i in missing])
+            with self._lock:
+                for i, score in zip(missing, fresh):
+                    scores[i] = score
+                    self._scores[keys[i]] = score
+                while len(self._scores) > config.RERANK_CACHE_MAX_ENTRIES:
+                    self._scores.popitem(last=False)
+
+        best = heapq.nlargest(top_n, range(len(documents)), key=lambda i: scores[i])
+        return [documents[i] for i in best]
+
+    def _predict_batch(self, pairs: list[tuple[str, str]]) -> list[float]:
+        start = time.perf_counter()
+        scores = [float(score) for score in self.predict_fn([list(pair) for pair in pairs])]
+        with self._lock:
+            self._stats["predict_calls"] += 1
+            self._stats["pairs_scored"] += len(pairs)
+            self._stats["predict_seconds"] += time.perf_counter() - start
+        return scores
+
+    def stats(self) -> dict:
+        """Counters per mechanism, with cross-encoder time saved estimated from the average pair cost."""
+        with self._lock:
+            stats = dict(self._stats)
+        seconds_per_pair = stats["predict_seconds"] / stats["pairs_scored"] if stats["pairs_scored"] else 0.0
+        stats["cache_seconds_saved"] = stats["cache_hits"] * seconds_per_pair
+        stats["early_exit_seconds_saved"] = stats["early_exit_pairs_skipped"] * seconds_per_pair
+        stats["requests_per_predict_call"] = (
+            stats["scoring_requests"] / stats["predict_calls"] if stats["predict_calls"] else 0.0
+        )
+        return stats
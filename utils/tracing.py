@@ -0,0 +1,190 @@
+# utils/tracing.py
+
+"""Spans and metrics keyed by the bus `trace_id`, exported as JSON lines (TRACE_FILE) and in Prometheus text format."""
+
+import os
+import json
+import time
+import uuid
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from utils.logging_config import logger
+from config import config
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+METRIC_HELP = {
+    "span_duration_seconds": "Duration of traced stages, by span name.",
+    "bus_messages_sent_total": "Messages sent over the bus, by message type.",
+    "bus_queue_depth": "Queue length observed right after the last send, by queue.",
+    "bus_queue_wait_seconds": "Time between send and receive, by message type.",
+    "llm_prompt_tokens_total": "Prompt tokens evaluated by the LLM.",
+    "llm_generated_tokens_total": "Tokens sampled by the LLM.",
+    "llm_tokens_per_second": "Decode throughput of each generation.",
+    "llm_queue_depth": "Generations waiting for a free slot.",
+    "llm_queue_wait_seconds": "Time generations waited for a slot, by priority.",
+    "llm_jobs_total": "Generation jobs by outcome (completed, failed, expired, shed) and priority.",
+}
+
+# (trace_id, span_id) of the span active in the current thread or task.
+_current_span = contextvars.ContextVar("current_span", default=(None, None))
+
+class Histogram:
+    """Fixed-bucket histogram in the Prometheus sense (bucket counts are made cumulative on export)."""
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class Tracer:
+    def __init__(self, enabled: bool = config.TRACING_ENABLED, trace_file: str | None = config.TRACE_FILE):
+        self.enabled = enabled
+        self.trace_file = trace_file
+        self._lock = threading.Lock()
+        self._metrics: dict[str, tuple[str, dict]] = {}  # name -> (kind, {labels: value})
+        self._file = None
+        self._server = None
+
+    @contextmanager
+    def span(self, name: str, trace_id: str | None = None, **attributes):
+        """Times the enclosed block. Yields the attribute dict so callers can add results to it."""
+        if not self.enabled:
+            yield attributes
+            return
+        parent_trace_id, parent_id = _current_span.get()
+        trace_id = trace_id or parent_trace_id
+        span_id = uuid.uuid4().hex[:16]
+        token = _current_span.set((trace_id, span_id))
+        start, clock, status = time.time(), time.perf_counter(), "ok"
+        try:
+            yield attributes
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            _current_span.reset(token)
+            self._finish(name, trace_id, span_id, parent_id, start, time.perf_counter() - clock, status, attributes)
+
+    def record_span(self, name: str, start: float, duration: float, trace_id: str | None = None, **attributes):
+        """Records a span timed by the caller, e.g. across a generator's yields or between processes."""
+        if not self.enabled:
+            return
+        parent_trace_id, parent_id = _current_span.get()
+        self._finish(name, trace_id or parent_trace_id, uuid.uuid4().hex[:16], parent_id,
+                     start, max(duration, 0.0), "ok", attributes)
+
+    def _finish(self, name, trace_id, span_id, parent_id, start, duration, status, attributes):
+        self.observe("span_duration_seconds", duration, span=name)
+        if not self.trace_file:
+            return
+        record = json.dumps({
+            "trace_id": trace_id, "span_id": span_id, "parent_id": parent_id, "name": name,
+            "start": start, "duration": duration, "status": status, "pid": os.getpid(),
+            "attributes": attributes,
+        }, default=str)
+        with self._lock:
+            try:
+                if self._file is None:
+                    os.makedirs(os.path.dirname(self.trace_file) or ".", exist_ok=True)
+                    self._file = open(self.trace_file, "a", buffering=1, encoding="utf-8")
+                self._file.write(record + "\n")
+            except OSError as e:
+                logger.warning(f"Disabling trace export to {self.trace_file}: {e}")
+                self.trace_file = None
+
+    # --- Metrics ---
+    def observe(self, name: str, value: float, buckets=LATENCY_BUCKETS, **labels):
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series(name, "histogram")
+            if key not in series:
+                series[key] = Histogram(buckets)
+            series[key].observe(value)
+
+    def increment(self, name: str, amount: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series(name, "counter")
+            series[key] = series.get(key, 0) + amount
+
+    def set_gauge(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._series(name, "gauge")[tuple(sorted(labels.items()))] = value
+
+    def _series(self, name: str, kind: str) -> dict:
+        if name not in self._metrics:
+            self._metrics[name] = (kind, {})
+        return self._metrics[name][1]
+
+    def render_prometheus(self, prefix: str = "rag_") -> str:
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, (kind, series) in sorted(self._metrics.items()):
+                full_name = prefix + name
+                if name in METRIC_HELP:
+                    lines.append(f"# HELP {full_name} {METRIC_HELP[name]}")
+                lines.append(f"# TYPE {full_name} {kind}")
+                for labels, value in sorted(series.items()):
+                    if kind != "histogram":
+                        lines.append(f"{full_name}{_format_labels(labels)} {value}")
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(value.buckets + (float("inf"),), value.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(float(bound))
+                        lines.append(f"{full_name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{full_name}_sum{_format_labels(labels)} {value.sum}")
+                    lines.append(f"{full_name}_count{_format_labels(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+    def start_metrics_server(self, port: int = config.METRICS_PORT, host: str = "0.0.0.0"):
+        """Serves `render_prometheus()` at http://host:port/metrics from a daemon thread (idempotent)."""
+        with self._lock:
+            if self._server is not None:
+                return self._server
+            self._server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            self._server.tracer = self
+        threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True).start()
+        logger.info(f"Serving metrics at http://{host}:{port}/metrics")
+        return self._server
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.tracer.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes would otherwise flood stderr.
+
+# Process-wide tracer shared by the bus, the agents and the inference services.
+tracer = Tracer()